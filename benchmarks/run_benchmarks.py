@@ -0,0 +1,331 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Headless benchmarks of the planning pipeline.
+
+Every benchmark runs at a few sizes and reports its wall time (best of the repeats), peak memory traced by
+tracemalloc (from a separate run, tracing slows the code down) and throughput in items per second. The report is
+written as JSON and can be compared against a stored baseline:
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --time-threshold 1.25
+
+The comparison exits with status 1 if any benchmark got slower or used more memory than the thresholds allow.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# sizes run by each suite, quick is meant for every change and full for a release
+SUITES = {
+    'quick': {
+        'partitioning': [(48, 32), (480, 320)],
+        'get_uav_paths': [(8, 8, 3), (20, 20, 4)],
+        'find_feasible_partitions': [(8, 5), (16, 10)],
+        'coverage_partitions': [(48, 32), (480, 320)],
+        'exact_tsp': [8, 12],
+        'heuristic_tsp': [200, 1000],
+        'ant_tsp': [30],
+        'genetic_tsp': [30],
+        'informed_rrt_star': [(500, 1), (500, 50)],
+    },
+    'full': {
+        'partitioning': [(48, 32), (480, 320), (1584, 1056)],
+        'get_uav_paths': [(8, 8, 3), (20, 20, 4), (48, 32, 8)],
+        'find_feasible_partitions': [(8, 5), (16, 10), (48, 32)],
+        'coverage_partitions': [(48, 32), (480, 320), (1584, 1056)],
+        'exact_tsp': [8, 12, 16],
+        'heuristic_tsp': [200, 1000, 5000],
+        'ant_tsp': [30, 100],
+        'genetic_tsp': [30, 100],
+        'informed_rrt_star': [(500, 1), (2000, 50), (2000, 500)],
+    },
+}
+
+# hardware specs of testing_grounds.py
+SPECS = {'uG_max': 0.5, 'uA_max': 1, 'd': 1, 'e': 1, 'B+': 0.5, 'B-': 0.3, 'n': 3}
+
+
+def random_cities(n, seed=0):
+    rng = random.Random(seed)
+    return [(rng.random() * 100, rng.random() * 100) for _ in range(n)]
+
+
+# each benchmark takes a size and returns a function running the work once, and the number of items it processes,
+# setup that should not be timed happens before the function is returned
+
+
+def bench_partitioning(size):
+    from tools.paper_algorithms import partitioning
+    x_bar, y_bar = size
+
+    def run():
+        for a1 in range(1, 9):
+            for a2 in range(1, 9):
+                partitioning(a1, a2, x_bar, y_bar)
+
+    return run, 64
+
+
+def bench_get_uav_paths(size):
+    from tools.environment import Environment
+    from tools.guiga_algorithms import get_uav_paths
+    width, length, n = size
+
+    def run():
+        get_uav_paths(environment=Environment(width=width, length=length), number_of_uavs=n)
+
+    return run, width * length
+
+
+def bench_find_feasible_partitions(size):
+    from tools.paper_algorithms import find_feasible_partitions
+    x_bar, y_bar = size
+
+    def run():
+        find_feasible_partitions(x_bar, y_bar, SPECS, max_cells=100)
+
+    return run, x_bar * y_bar
+
+
+def bench_coverage_partitions(size):
+    from tools.paper_algorithms import find_feasible_partitions
+    x_bar, y_bar = size
+
+    # enough energy for partitions of a few hundred cells, far past what the sector routes can check
+    specs = dict(SPECS, e=30)
+
+    def run():
+        find_feasible_partitions(x_bar, y_bar, specs, prune=True, coverage=True)
+
+    return run, x_bar * y_bar
+
+
+def bench_exact_tsp(size):
+    from tsp_algorithms.tsp_algorithms import exact_tsp
+    cities = random_cities(size)
+
+    def run():
+        exact_tsp(cities)
+
+    return run, size
+
+
+def bench_heuristic_tsp(size):
+    from tsp_algorithms.tsp_algorithms import heuristic_tsp
+    cities = random_cities(size)
+
+    def run():
+        heuristic_tsp(cities)
+
+    return run, size
+
+
+def bench_ant_tsp(size):
+    from tsp_algorithms.tsp_algorithms import ant_tsp
+    cities = random_cities(size)
+
+    def run():
+        random.seed(0)
+        ant_tsp(cities)
+
+    return run, size
+
+
+def bench_genetic_tsp(size):
+    from tsp_algorithms.tsp_algorithms import genetic_tsp
+    cities = random_cities(size)
+
+    def run():
+        genetic_tsp(cities, seed=0)
+
+    return run, size
+
+
+def bench_informed_rrt_star(size):
+    from tools.informed_rrt_star import InformedRRTStar
+    iterations, count = size
+
+    # obstacles scattered between the start and the goal, keeping clear of both
+    rng = random.Random(0)
+    obstacles = []
+    while len(obstacles) < count:
+        x, y = rng.uniform(1, 14), rng.uniform(1, 14)
+        if math.hypot(x, y) > 1.5 and math.hypot(x - 14, y - 14) > 1.5:
+            obstacles.append((x, y, rng.uniform(0.1, 0.5)))
+
+    def run():
+        random.seed(0)
+        planner = InformedRRTStar(start=[0, 0], goal=[14, 14], obstacleList=obstacles, randArea=[-2, 16],
+                                  maxIter=iterations)
+        planner.informed_rrt_star_search()
+
+    return run, iterations
+
+
+BENCHMARKS = {
+    'partitioning': bench_partitioning,
+    'get_uav_paths': bench_get_uav_paths,
+    'find_feasible_partitions': bench_find_feasible_partitions,
+    'coverage_partitions': bench_coverage_partitions,
+    'exact_tsp': bench_exact_tsp,
+    'heuristic_tsp': bench_heuristic_tsp,
+    'ant_tsp': bench_ant_tsp,
+    'genetic_tsp': bench_genetic_tsp,
+    'informed_rrt_star': bench_informed_rrt_star,
+}
+
+
+def size_label(size):
+    return 'x'.join(str(value) for value in size) if isinstance(size, tuple) else str(size)
+
+
+def measure(benchmark, size, repeat):
+    """
+    :param benchmark    : a benchmark function from BENCHMARKS
+    :param size         : the size to run it at
+    :param repeat       : number of timed runs, the fastest is reported
+    :return             : a dictionary with wall_time, peak_memory and throughput, or skipped with the reason when an
+                          optional dependency (such as the tsp package behind exact_tsp) is missing
+    """
+    try:
+        run, items = benchmark(size)
+
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    except ImportError as error:
+        return {'skipped': f'missing dependency: {error}'}
+
+    wall_time = min(times)
+
+    return {
+        'wall_time': wall_time,
+        'peak_memory': peak,
+        'throughput': items / wall_time if wall_time > 0 else math.inf,
+        'items': items,
+        'repeat': repeat,
+    }
+
+
+def run_suite(suite='quick', only=None, repeat=3, log=None):
+    """
+    :param suite    : a key of SUITES
+    :param only     : optional list of benchmark names to run, all of them if None
+    :param repeat   : number of timed runs per size
+    :param log      : optional stream progress is written to
+    :return         : the JSON serialisable report
+    """
+    results = {}
+
+    for name, sizes in SUITES[suite].items():
+        if only and name not in only:
+            continue
+
+        results[name] = {}
+
+        for size in sizes:
+            result = measure(BENCHMARKS[name], size, repeat)
+            results[name][size_label(size)] = result
+
+            if log is not None:
+                if 'skipped' in result:
+                    print(f'{name:26} {size_label(size):>12}  skipped ({result["skipped"]})', file=log)
+                else:
+                    print(f'{name:26} {size_label(size):>12}  {result["wall_time"]:10.4f} s  '
+                          f'{result["peak_memory"] / 2 ** 20:9.2f} MiB  {result["throughput"]:12.1f} items/s',
+                          file=log)
+
+    return {
+        'suite': suite,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report, baseline, time_threshold=1.25, memory_threshold=1.25):
+    """
+    :param report           : a report returned by run_suite
+    :param baseline         : a report stored from an earlier run
+    :param time_threshold   : a benchmark regresses if its wall time grows by more than this factor
+    :param memory_threshold : a benchmark regresses if its peak memory grows by more than this factor
+    :return                 : a list of regressions, each a dictionary naming the benchmark, size, metric and ratio
+    """
+    regressions = []
+
+    for name, sizes in report['results'].items():
+        for label, result in sizes.items():
+            before = baseline.get('results', {}).get(name, {}).get(label)
+
+            if before is None or 'skipped' in result or 'skipped' in before:
+                continue
+
+            for metric, threshold in (('wall_time', time_threshold), ('peak_memory', memory_threshold)):
+                if before[metric] <= 0:
+                    continue
+
+                ratio = result[metric] / before[metric]
+
+                if ratio > threshold:
+                    regressions.append({'benchmark': name, 'size': label, 'metric': metric,
+                                        'baseline': before[metric], 'current': result[metric], 'ratio': ratio})
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless benchmarks of the UAV/UGV planning pipeline.')
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size, the fastest is reported')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='a stored JSON report to compare against')
+    parser.add_argument('--time-threshold', type=float, default=1.25, help='allowed wall time ratio to the baseline')
+    parser.add_argument('--memory-threshold', type=float, default=1.25, help='allowed peak memory ratio')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.suite, only=args.only, repeat=args.repeat, log=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        report['regressions'] = compare(report, baseline, args.time_threshold, args.memory_threshold)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for regression in report.get('regressions', []):
+        print(f'REGRESSION {regression["benchmark"]} {regression["size"]} {regression["metric"]}: '
+              f'{regression["baseline"]:.4g} -> {regression["current"]:.4g} ({regression["ratio"]:.2f}x)',
+              file=sys.stderr)
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,9 @@
 import random
 import tools.paper_algorithms as pa
 import tools.guiga_algorithms as gumo
-import tools.informed_rrt_star as star
 from tsp_algorithms.tsp_algorithms import exact_tsp
 from tools.environment import Voxel
-import matplotlib.pyplot as plt
+from tools.draw import render_mission_plan
 
 
 def get_random_color(pastel_factor=0.5):
@@ -95,34 +94,13 @@ if __name__ == "__main__":
 
     print(f'Environment Size: {x_bar}x{y_bar}\n')
 
-    pic = pa.uav_ugv_trajectory_generation(x_bar=x_bar,
-                                           y_bar=y_bar,
-                                           specs=hardware_specs,
-                                           obstacles=environment_voxels['obstacle'])
+    # route segments crossing an obstacle are replaced by informed rrt star detours inside the pipeline,
+    # pass workers=<number of processes> to plan them in parallel
+    plan = pa.uav_ugv_trajectory_generation(x_bar=x_bar,
+                                            y_bar=y_bar,
+                                            specs=hardware_specs,
+                                            obstacles=environment_voxels['obstacle'])
 
+    # drawing is a separate step, leave it out to plan headless
+    pic = render_mission_plan(plan)
     pic.show_fig()
-
-    # the lines below calculate the obstacle avoidance path for one obstacle
-    # this has not been incorporated to run automatically yet
-
-    for obstacle in environment_voxels['obstacle']:
-
-        print("\nStart informed rrt star planning")
-
-        # create obstacles
-        obstacleList = [
-            (obstacle[0][0], obstacle[0][1], obstacle[1]),
-        ]
-
-        # Set params
-        rrt = star.InformedRRTStar(start=[3, 1.5], goal=[5, 1.5],
-                              randArea=[-2, 15], obstacleList=obstacleList)
-        path = rrt.informed_rrt_star_search(animation=True)
-        print("Done!!")
-
-        # Plot path
-        rrt.draw_graph()
-        plt.plot([x for (x, y) in path], [y for (x, y) in path], '-r')
-        plt.grid(True)
-        plt.pause(0.01)
-        plt.show()
@@ -0,0 +1,20 @@
+import pytest
+import tools.detours as dt
+from tools.collision import CircleObstacles
+
+
+@pytest.mark.parametrize('x', [0.0, 10.0, 25.0, 40.0])
+def test_detour_far_from_diagonal(x):
+    # a segment along y = 1 with an obstacle on it, the further along x the further it lies from the y = x diagonal
+    start, goal = (x, 1.0), (x + 6.0, 1.0)
+    circles = dt.obstacle_circles([[(x + 3.0, 1.0), 0.5]])
+    key, _ = dt.segment_key(start, goal, circles)
+
+    detour = dt.plan_detour(key)
+
+    assert detour is not None
+    assert detour[0] == start and detour[-1] == goal
+
+    collision = CircleObstacles(circles)
+    for a, b in zip(detour, detour[1:]):
+        assert collision.segment_free(a[0], a[1], b[0], b[1])
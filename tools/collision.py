@@ -0,0 +1,186 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+"""
+import math
+import numpy as np
+from tools import instrumentation
+
+# below this many obstacles every segment is simply tested against every obstacle
+BROAD_PHASE_MIN_OBSTACLES = 16
+
+# number of segment-obstacle pairs compared at a time by the batched broad phase
+BROAD_PHASE_BLOCK = 1 << 20
+
+
+def segment_point_distance_squared(x1, y1, x2, y2, px, py):
+    """
+    :param x1, y1   : start of the segment(s)
+    :param x2, y2   : end of the segment(s)
+    :param px, py   : the point(s), all arguments broadcast against each other
+    :return         : squared distance from each point to the closest point on its segment
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    l2 = dx * dx + dy * dy
+
+    # project the point onto the line through the segment and clamp the projection to the segment
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = ((px - x1) * dx + (py - y1) * dy) / l2
+    t = np.where(l2 > 0, np.clip(t, 0.0, 1.0), 0.0)
+
+    ex = x1 + t * dx - px
+    ey = y1 + t * dy - py
+
+    return ex * ex + ey * ey
+
+
+class CircleObstacles:
+    """
+    A set of circular obstacles held in arrays, with a uniform grid broad phase for segment queries.
+
+    Every obstacle is registered in each grid cell its bounding box touches. A segment is then only tested against
+    the obstacles registered in the cells its own bounding box touches.
+    """
+
+    def __init__(self, obstacles, cell_size=None):
+        """
+        :param obstacles : a list of (x, y, radius) circles
+        :param cell_size : side length of a broad phase cell, defaults to twice the largest radius
+        """
+        circles = np.asarray(list(obstacles), dtype=float).reshape(-1, 3)
+        self.x = circles[:, 0].copy()
+        self.y = circles[:, 1].copy()
+        self.radius = circles[:, 2].copy()
+        self._circles = circles.tolist()
+
+        if cell_size is None:
+            cell_size = 2 * self.radius.max() if len(self.radius) and self.radius.max() > 0 else 1.0
+
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self._all = np.arange(len(self))
+
+        # cell range covered by each obstacle's bounding box
+        self.cell_bounds = np.stack([np.floor(bound / self.cell_size).astype(np.int64) for bound in
+                                     (self.x - self.radius, self.y - self.radius,
+                                      self.x + self.radius, self.y + self.radius)])
+
+        if len(self) >= BROAD_PHASE_MIN_OBSTACLES:
+            for i, (cx_lo, cy_lo, cx_hi, cy_hi) in enumerate(self.cell_bounds.T.tolist()):
+                for cx in range(cx_lo, cx_hi + 1):
+                    for cy in range(cy_lo, cy_hi + 1):
+                        self.cells.setdefault((cx, cy), []).append(i)
+
+    def __len__(self):
+        return len(self.radius)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def candidates(self, x1, y1, x2, y2):
+        """
+        :param x1, y1   : start of the segment
+        :param x2, y2   : end of the segment
+        :return         : indices of the obstacles that may touch the segment
+        """
+        if not self.cells:
+            return self._all
+
+        cx_lo, cy_lo = self._cell(min(x1, x2), min(y1, y2))
+        cx_hi, cy_hi = self._cell(max(x1, x2), max(y1, y2))
+
+        if (cx_hi - cx_lo + 1) * (cy_hi - cy_lo + 1) > len(self.cells):
+            # a long segment covers more cells than are occupied, walk the occupied ones instead
+            cells = [cell for cell in self.cells if cx_lo <= cell[0] <= cx_hi and cy_lo <= cell[1] <= cy_hi]
+        else:
+            cells = [(cx, cy) for cx in range(cx_lo, cx_hi + 1) for cy in range(cy_lo, cy_hi + 1)]
+
+        found = set()
+        for cell in cells:
+            found.update(self.cells.get(cell, ()))
+
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def segments_free(self, x1, y1, x2, y2):
+        """
+        :param x1, y1   : arrays with the start of every segment
+        :param x2, y2   : arrays with the end of every segment
+        :return         : a boolean array, True where the segment does not touch any obstacle
+        """
+        x1, y1, x2, y2 = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x1, y1, x2, y2)))
+        shape = x1.shape
+        x1, y1, x2, y2 = (v.ravel() for v in (x1, y1, x2, y2))
+        instrumentation.count('collision.segment_checks', len(x1))
+
+        if len(self) == 0 or len(x1) == 0:
+            return np.ones(shape, dtype=bool)
+
+        if not self.cells:
+            # few obstacles, test every segment against every obstacle at once
+            d2 = segment_point_distance_squared(x1[:, None], y1[:, None], x2[:, None], y2[:, None],
+                                                self.x[None, :], self.y[None, :])
+            return ~np.any(d2 <= self.radius[None, :] ** 2, axis=1).reshape(shape)
+
+        # pair every segment with the obstacles whose cells overlap the cells of its bounding box,
+        # a block of segments at a time so the overlap matrix stays small
+        seg_bounds = np.stack([np.floor(bound / self.cell_size).astype(np.int64) for bound in
+                               (np.minimum(x1, x2), np.minimum(y1, y2), np.maximum(x1, x2), np.maximum(y1, y2))])
+        obs_bounds = self.cell_bounds
+        block = max(1, BROAD_PHASE_BLOCK // len(self))
+        segments = []
+        obstacles = []
+
+        for start in range(0, len(x1), block):
+            seg = seg_bounds[:, start:start + block, None]
+            overlap = ((seg[0] <= obs_bounds[2]) & (seg[2] >= obs_bounds[0])
+                       & (seg[1] <= obs_bounds[3]) & (seg[3] >= obs_bounds[1]))
+            rows, cols = np.nonzero(overlap)
+            segments.append(rows + start)
+            obstacles.append(cols)
+
+        segments = np.concatenate(segments)
+        obstacles = np.concatenate(obstacles)
+
+        if len(segments) == 0:
+            return np.ones(shape, dtype=bool)
+
+        d2 = segment_point_distance_squared(x1[segments], y1[segments], x2[segments], y2[segments],
+                                            self.x[obstacles], self.y[obstacles])
+        hits = np.bincount(segments[d2 <= self.radius[obstacles] ** 2], minlength=len(x1))
+
+        return (hits == 0).reshape(shape)
+
+    def segment_free(self, x1, y1, x2, y2):
+        """
+        :param x1, y1   : start of the segment
+        :param x2, y2   : end of the segment
+        :return         : True if the segment does not touch any obstacle
+        """
+        instrumentation.count('collision.segment_checks')
+
+        if len(self) == 0:
+            return True
+
+        indices = self.candidates(x1, y1, x2, y2)
+
+        if len(indices) > BROAD_PHASE_MIN_OBSTACLES:
+            d2 = segment_point_distance_squared(x1, y1, x2, y2, self.x[indices], self.y[indices])
+            return not np.any(d2 <= self.radius[indices] ** 2)
+
+        # for a handful of obstacles plain floats beat the overhead of building arrays
+        dx = x2 - x1
+        dy = y2 - y1
+        l2 = dx * dx + dy * dy
+
+        for i in indices.tolist():
+            ox = self._circles[i][0] - x1
+            oy = self._circles[i][1] - y1
+            t = min(1.0, max(0.0, (ox * dx + oy * dy) / l2)) if l2 > 0 else 0.0
+            ex = t * dx - ox
+            ey = t * dy - oy
+
+            if ex * ex + ey * ey <= self._circles[i][2] ** 2:
+                return False
+
+        return True
@@ -0,0 +1,142 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Boustrophedon (lawnmower) coverage routes for a rectangular partition of unit cells shared among n UAVs.
+
+The cells are ordered along a serpentine that sweeps the partition lane by lane, turning around at the end of every
+lane, so consecutive cells are always neighbours. Every UAV flies one contiguous stretch of the serpentine, out of
+the center and back. A stretch of k cells is then exactly d(center, first) + (k - 1) + d(last, center) long, route
+lengths need no routing at all and waypoints are only generated for the routes that are actually flown or drawn.
+"""
+import math
+
+
+def stretch_bounds(cells, n, uav):
+    """
+    :param cells    : number of cells of the partition
+    :param n        : number of UAVs
+    :param uav      : the uav number (1 to n)
+    :return         : serpentine position of the first cell of the uav's stretch, and one past its last cell
+    """
+    # the first cells % n uavs take one cell more than the others
+    size, extra = divmod(cells, n)
+    start = (uav - 1) * size + min(uav - 1, extra)
+
+    return start, start + size + (uav <= extra)
+
+
+def serpentine_cell(index, width, length, lanes_along_x=False):
+    """
+    :param index            : position along the serpentine
+    :param width            : width of the partition
+    :param length           : length of the partition
+    :param lanes_along_x    : the lanes run along the width, otherwise along the length
+    :return                 : [x, y] of the center of the cell at that position
+    """
+    if lanes_along_x:
+        y, x = serpentine_cell(index, length, width)
+        return [x, y]
+
+    lane, step = divmod(index, length)
+
+    # every other lane is swept backwards
+    if lane % 2:
+        step = length - 1 - step
+
+    return [lane + 0.5, step + 0.5]
+
+
+def route_length(width, length, n, uav, lanes_along_x=False):
+    """
+    :param width            : width of the partition
+    :param length           : length of the partition
+    :param n                : number of UAVs
+    :param uav              : the uav number (1 to n)
+    :param lanes_along_x    : the lanes run along the width, otherwise along the length
+    :return                 : length of the uav's route from the center over its stretch and back, 0 if it has no cells
+    """
+    start, end = stretch_bounds(width * length, n, uav)
+
+    if start == end:
+        return 0.0
+
+    cx, cy = width / 2, length / 2
+    fx, fy = serpentine_cell(start, width, length, lanes_along_x)
+    lx, ly = serpentine_cell(end - 1, width, length, lanes_along_x)
+
+    return math.hypot(fx - cx, fy - cy) + (end - 1 - start) + math.hypot(lx - cx, ly - cy)
+
+
+def lane_direction(width, length, n):
+    """
+    :param width    : width of the partition
+    :param length   : length of the partition
+    :param n        : number of UAVs
+    :return         : True if lanes along the width give the shorter max route, False for lanes along the length
+    """
+    along_length = max(route_length(width, length, n, uav) for uav in range(1, n + 1))
+    along_width = max(route_length(width, length, n, uav, lanes_along_x=True) for uav in range(1, n + 1))
+
+    return along_width < along_length
+
+
+def max_route_length(width, length, n):
+    """
+    :param width    : width of the partition
+    :param length   : length of the partition
+    :param n        : number of UAVs
+    :return         : the longest UAV route when the partition is covered with the better of the two lane directions
+    """
+    lanes_along_x = lane_direction(width, length, n)
+
+    return max(route_length(width, length, n, uav, lanes_along_x) for uav in range(1, n + 1))
+
+
+def coverage_waypoints(width, length, n, uav, lanes_along_x=None):
+    """
+    :param width            : width of the partition
+    :param length           : length of the partition
+    :param n                : number of UAVs
+    :param uav              : the uav number (1 to n)
+    :param lanes_along_x    : the lanes run along the width, picked by lane_direction if None
+    :return                 : yields the waypoints of the uav's route, from the center over its stretch and back
+    """
+    if lanes_along_x is None:
+        lanes_along_x = lane_direction(width, length, n)
+
+    center = [width / 2, length / 2]
+    start, end = stretch_bounds(width * length, n, uav)
+
+    yield center
+
+    for index in range(start, end):
+        yield serpentine_cell(index, width, length, lanes_along_x)
+
+    yield center
+
+
+def coverage_routes(environment, number_of_uavs):
+    """
+    :param environment      : an instance of the Environment class
+    :param number_of_uavs   : the number of uavs (k)
+    :return                 : a dictionary containing all of the routes, in the same form as get_uav_paths, and the
+                              first cell of every uav's stretch
+    """
+    width, length = environment.width, environment.length
+    lanes_along_x = lane_direction(width, length, number_of_uavs)
+
+    uav_paths = {}
+    split = []
+
+    for uav in range(1, number_of_uavs + 1):
+        start, end = stretch_bounds(width * length, number_of_uavs, uav)
+
+        # like the sectors, a uav left without cells gets no route
+        if start == end:
+            continue
+
+        uav_paths[f'{uav}'] = list(coverage_waypoints(width, length, number_of_uavs, uav, lanes_along_x))
+        split.append(serpentine_cell(start, width, length, lanes_along_x))
+
+    return uav_paths, split
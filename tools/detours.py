@@ -0,0 +1,266 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Detours around obstacles for the straight route segments flown by the UAVs and driven by the UGV.
+"""
+import random
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from tools import instrumentation
+from tools.collision import CircleObstacles, segment_point_distance_squared
+from tools.informed_rrt_star import InformedRRTStar
+
+# coordinates are rounded to this many decimals when used as cache keys
+KEY_DECIMALS = 9
+
+
+def obstacle_circles(obstacles):
+    """
+    :param obstacles    : obstacles as listed in environment_voxels['obstacle'], [[(x, y), radius], ...],
+                          (x, y, radius) tuples are accepted as well
+    :return             : a sorted tuple of (x, y, radius) circles
+    """
+    circles = []
+
+    for obstacle in obstacles:
+        if len(obstacle) == 2:
+            (x, y), radius = obstacle
+        else:
+            x, y, radius = obstacle
+
+        circles.append((float(x), float(y), float(radius)))
+
+    return tuple(sorted(circles))
+
+
+def _point_key(point):
+    return round(float(point[0]), KEY_DECIMALS), round(float(point[1]), KEY_DECIMALS)
+
+
+def segment_key(start, goal, circles):
+    """
+    :param start    : start of the segment
+    :param goal     : end of the segment
+    :param circles  : obstacle circles as returned by obstacle_circles
+    :return         : the cache key of the segment, and True if the segment runs against the key's direction
+    """
+    a = _point_key(start)
+    b = _point_key(goal)
+
+    # a detour from b to a is the detour from a to b reversed, so both directions share one entry
+    if b < a:
+        return (b, a, circles), True
+
+    return (a, b, circles), False
+
+
+class DetourCache:
+    """
+    Planned detours keyed by (start, goal, obstacle set). A detour that could not be planned is stored as None,
+    so the same segment is not planned again.
+    """
+
+    def __init__(self):
+        self.detours = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.detours)
+
+    def __contains__(self, key):
+        return key in self.detours
+
+    def get(self, key):
+        if key in self.detours:
+            self.hits += 1
+            instrumentation.count('detour_cache.hits')
+        else:
+            self.misses += 1
+            instrumentation.count('detour_cache.misses')
+
+        return self.detours.get(key)
+
+    def put(self, key, path):
+        self.detours[key] = path
+
+
+def plan_detour(key, max_iter=500, time_budget=None, stall_iterations=150, expand_dis=0.25):
+    """
+    :param key              : a segment key as returned by segment_key
+    :param max_iter         : iteration cap of the planner
+    :param time_budget      : an optional deadline in wall-clock seconds, a search it cuts short depends on the
+                              speed of the machine, leave it None for the same detour every time
+    :param stall_iterations : the planner stops once its best path has not improved for this many iterations
+    :param expand_dis       : planner step length
+    :return                 : the detour as a list of points from start to goal, None if no path was found
+    """
+    start, goal, circles = key
+
+    # seed from the key so a segment always gets the same detour, in any process, without touching the global
+    # random state of the caller
+    rng = random.Random(zlib.crc32(repr(key).encode()))
+
+    collision = CircleObstacles(circles)
+
+    # an endpoint inside an obstacle leaves nothing to go around
+    if not collision.segment_free(*start, *start) or not collision.segment_free(*goal, *goal):
+        return None
+
+    # sample around the segment with enough margin to go around the obstacles it hits
+    d2 = segment_point_distance_squared(start[0], start[1], goal[0], goal[1], collision.x, collision.y)
+    hit = d2 <= collision.radius ** 2
+    margin = 2 * (collision.radius[hit].max() if hit.any() else 0.0) + expand_dis
+
+    # a square centered on the segment and sized by its longer side, so it stays small wherever the segment lies
+    mx, my = (start[0] + goal[0]) / 2, (start[1] + goal[1]) / 2
+    half = max(abs(goal[0] - start[0]), abs(goal[1] - start[1])) / 2 + margin
+
+    planner = InformedRRTStar(start=list(start), goal=list(goal), obstacleList=list(circles),
+                              randArea=[mx - half, mx + half, my - half, my + half], expandDis=expand_dis,
+                              maxIter=max_iter, rng=rng)
+    path, _ = planner.anytime_search(time_budget=time_budget, stall_iterations=stall_iterations,
+                                         max_iter=max_iter)
+
+    if path is None:
+        return None
+
+    # the planner lists the path from the goal back to the start
+    return [tuple(point) for point in reversed(path)]
+
+
+def _plan_detour(args):
+    # unpacks the arguments sent to a worker process
+    key, options = args
+    return plan_detour(key, **options)
+
+
+def crossing_segments(route, collision):
+    """
+    :param route        : a list of points
+    :param collision    : a CircleObstacles instance
+    :return             : the indices k of the segments route[k] -> route[k + 1] that touch an obstacle
+    """
+    if len(route) < 2:
+        return []
+
+    xs = [point[0] for point in route]
+    ys = [point[1] for point in route]
+    free = collision.segments_free(xs[:-1], ys[:-1], xs[1:], ys[1:])
+
+    return [k for k, is_free in enumerate(free.tolist()) if not is_free]
+
+
+def detour_executor(workers):
+    """
+    :param workers  : number of worker processes planning detours
+    :return         : a ProcessPoolExecutor to pass to plan_detours over a whole search, None if workers is None or 1,
+                      the caller shuts it down
+    """
+    if workers is None or workers <= 1:
+        return None
+
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def plan_detours(routes, obstacles, cache=None, workers=None, executor=None, **options):
+    """
+    :param routes       : a list of routes, each a list of points
+    :param obstacles    : obstacles in any form accepted by obstacle_circles
+    :param cache        : an optional DetourCache, shared between calls so recurring segments are planned once
+    :param workers      : number of worker processes planning detours, None or 1 plans them serially
+    :param executor     : an optional executor from detour_executor, reused instead of starting a pool per call
+    :param options      : planner options passed on to plan_detour
+    :return             : the cache holding a detour (or None) for every segment crossing an obstacle
+    """
+    if cache is None:
+        cache = DetourCache()
+
+    circles = obstacle_circles(obstacles)
+    collision = CircleObstacles(circles)
+
+    # collect every distinct crossing segment that has not been planned yet
+    pending = []
+    seen = set()
+
+    for route in routes:
+        for k in crossing_segments(route, collision):
+            key, reverse = segment_key(route[k], route[k + 1], circles)
+
+            if key not in cache and key not in seen:
+                seen.add(key)
+                pending.append(key)
+
+    tasks = [(key, options) for key in pending]
+    instrumentation.count('detours.planned', len(tasks))
+
+    if len(tasks) <= 1 or (executor is None and (workers is None or workers <= 1)):
+        detours = list(map(_plan_detour, tasks))
+    elif executor is not None:
+        detours = list(executor.map(_plan_detour, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            detours = list(executor.map(_plan_detour, tasks))
+
+    # a segment without a detour rules out the routes crossing it, count them apart from the planned ones
+    instrumentation.count('detours.failed', sum(detour is None for detour in detours))
+
+    for key, detour in zip(pending, detours):
+        cache.put(key, detour)
+
+    return cache
+
+
+def drop_blocked_points(route, obstacles):
+    """
+    :param route        : a list of points
+    :param obstacles    : obstacles in any form accepted by obstacle_circles
+    :return             : the route without the points lying inside an obstacle, which cannot be flown to
+    """
+    if len(route) == 0:
+        return list(route)
+
+    xs = [point[0] for point in route]
+    ys = [point[1] for point in route]
+
+    # a segment from a point to itself touches an obstacle only if the point lies inside it
+    free = CircleObstacles(obstacle_circles(obstacles)).segments_free(xs, ys, xs, ys)
+
+    return [point for point, is_free in zip(route, free.tolist()) if is_free]
+
+
+def patch_route(route, obstacles, cache):
+    """
+    :param route        : a list of points
+    :param obstacles    : obstacles in any form accepted by obstacle_circles
+    :param cache        : a DetourCache already filled by plan_detours
+    :return             : the route with every crossing segment replaced by its detour, None if a crossing segment
+                          has no detour (the planner found none, or an endpoint lies inside an obstacle)
+    """
+    circles = obstacle_circles(obstacles)
+    crossing = set(crossing_segments(route, CircleObstacles(circles)))
+
+    if not crossing:
+        return list(route)
+
+    patched = [route[0]]
+
+    for k in range(len(route) - 1):
+        if k in crossing:
+            key, reverse = segment_key(route[k], route[k + 1], circles)
+            detour = cache.get(key)
+
+            # flying straight through the obstacle is not an option
+            if detour is None:
+                return None
+
+            if reverse:
+                detour = detour[::-1]
+
+            # the detour starts at route[k], which is already in the patched route, and ends at route[k + 1]
+            patched.extend([list(point) for point in detour[1:-1]])
+
+        patched.append(route[k + 1])
+
+    return patched
@@ -0,0 +1,320 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+A Euclidean distance field over an occupancy grid, used as a collision backend.
+
+The squared distance transform is the exact one of P. Felzenszwalb and D. Huttenlocher, Distance Transforms of
+Sampled Functions, run one axis at a time over every grid line at once.
+"""
+import math
+import numpy as np
+
+from tools import instrumentation
+from tools.environment import OBSTACLE
+
+# parameter nudge used to step over a cell boundary, relative to the segment length
+BOUNDARY_STEP = 1e-9
+
+# batches of up to this many 2D segments are traced one at a time, the array march only pays off above it
+SCALAR_MAX_SEGMENTS = 32
+
+
+def _first_axis(occupied):
+    # squared distance along the last axis to the nearest occupied cell of the same line, inf if the line has none
+    n = occupied.shape[-1]
+    index = np.arange(n)
+
+    left = np.where(occupied, index, -np.inf)
+    left = np.maximum.accumulate(left, axis=-1)
+    right = np.where(occupied, index, np.inf)
+    right = np.minimum.accumulate(right[..., ::-1], axis=-1)[..., ::-1]
+
+    return np.minimum(index - left, right - index) ** 2
+
+
+def _lower_envelope(f):
+    """
+    :param f    : an (L, n) array of squared distances, inf where a line has no sample
+    :return     : an (L, n) array, out[l, q] = min over p of (q - p) ** 2 + f[l, p]
+    """
+    lines, n = f.shape
+
+    # parabola apexes v and the boundaries z between them of the lower envelope of every line,
+    # k is the last parabola of each line, -1 while a line has none
+    v = np.zeros((lines, n), dtype=np.int64)
+    z = np.full((lines, n + 1), np.inf)
+    k = np.full(lines, -1)
+
+    for q in range(n):
+        fq = f[:, q]
+        adding = np.flatnonzero(np.isfinite(fq))
+
+        if len(adding) == 0:
+            continue
+
+        # drop the parabolas that the one at q hides, z[l, 0] is -inf so the first one always stays
+        while True:
+            last = adding[k[adding] >= 0]
+            vk = v[last, k[last]]
+            s = ((fq[last] + q * q) - (f[last, vk] + vk * vk)) / (2.0 * (q - vk))
+            hidden = s <= z[last, k[last]]
+
+            if not hidden.any():
+                break
+
+            k[last[hidden]] -= 1
+
+        s = np.full(len(adding), -np.inf)
+        last = k[adding] >= 0
+        vk = v[adding[last], k[adding[last]]]
+        s[last] = ((fq[adding[last]] + q * q) - (f[adding[last], vk] + vk * vk)) / (2.0 * (q - vk))
+
+        k[adding] += 1
+        v[adding, k[adding]] = q
+        z[adding, k[adding]] = s
+        z[adding, k[adding] + 1] = np.inf
+
+    out = np.full((lines, n), np.inf)
+    j = np.zeros(lines, dtype=np.int64)
+    filled = np.flatnonzero(k >= 0)
+
+    for q in range(n):
+        # move to the parabola whose interval holds q
+        while True:
+            ahead = filled[z[filled, j[filled] + 1] < q]
+
+            if len(ahead) == 0:
+                break
+
+            j[ahead] += 1
+
+        vj = v[filled, j[filled]]
+        out[filled, q] = (q - vj) ** 2 + f[filled, vj]
+
+    return out
+
+
+def squared_distance_transform(occupied):
+    """
+    :param occupied : a boolean array of any dimension, True where a cell is occupied
+    :return         : the squared euclidean distance, in cells, from every cell center to the nearest occupied cell
+                      center, inf if nothing is occupied
+    """
+    occupied = np.asarray(occupied, dtype=bool)
+    d2 = _first_axis(occupied)
+
+    for axis in range(occupied.ndim - 1):
+        moved = np.moveaxis(d2, axis, -1)
+        shape = moved.shape
+        d2 = np.moveaxis(_lower_envelope(moved.reshape(-1, shape[-1])).reshape(shape), -1, axis)
+
+    return d2
+
+
+class DistanceField:
+    """
+    Occupancy grid plus its distance transform, answering clearance and segment queries without looking at the
+    obstacles themselves.
+
+    Cell i covers [origin + i * resolution, origin + (i + 1) * resolution) on every axis. A segment is free if it
+    enters no occupied cell, space outside the grid is free. Segments are sphere traced: every step moves at least
+    to the exit of the current (free) cell, and further wherever the distance field proves the space clear.
+    """
+
+    def __init__(self, occupied, resolution=1.0, origin=None):
+        """
+        :param occupied     : a boolean array, True where a cell is occupied, 2D for planar planning
+        :param resolution   : side length of a cell
+        :param origin       : world coordinates of the corner of cell 0, zeros by default
+        """
+        self.occupied = np.asarray(occupied, dtype=bool)
+        self.ndim = self.occupied.ndim
+        self.shape = np.array(self.occupied.shape)
+        self.resolution = float(resolution)
+        self.origin = np.zeros(self.ndim) if origin is None else np.asarray(origin, dtype=float)
+        self.upper = self.origin + self.shape * self.resolution
+
+        # world distance between cell centers
+        self.distance = np.sqrt(squared_distance_transform(self.occupied)) * self.resolution
+
+        # no point of a cell is further than this from its center, so points of a cell and an occupied cell are at
+        # least distance - margin apart
+        self.margin = math.sqrt(self.ndim) * self.resolution
+
+    @classmethod
+    def from_voxel_grid(cls, grid, z=None, resolution=1.0):
+        """
+        :param grid         : a VoxelGrid
+        :param z            : a voxel layer, gives a 2D field of that layer, None keeps the 3D field
+        :param resolution   : side length of a voxel
+        :return             : a DistanceField over the grid's obstacle voxels
+        """
+        occupied = np.asarray(grid.codes) == OBSTACLE
+
+        if z is not None:
+            occupied = occupied[:, :, z]
+
+        return cls(occupied, resolution=resolution)
+
+    @classmethod
+    def from_circles(cls, obstacles, bounds, resolution):
+        """
+        :param obstacles    : a list of (x, y, radius) circles
+        :param bounds       : (x_min, y_min, x_max, y_max) area covered by the grid
+        :param resolution   : side length of a cell
+        :return             : a 2D DistanceField with every cell a circle overlaps marked occupied
+        """
+        x_min, y_min, x_max, y_max = bounds
+        nx = max(1, math.ceil((x_max - x_min) / resolution))
+        ny = max(1, math.ceil((y_max - y_min) / resolution))
+        occupied = np.zeros((nx, ny), dtype=bool)
+
+        xs = x_min + np.arange(nx) * resolution
+        ys = y_min + np.arange(ny) * resolution
+
+        for (cx, cy, radius) in obstacles:
+            # distance from the center to the closest point of each cell
+            dx = np.clip(cx, xs, xs + resolution) - cx
+            dy = np.clip(cy, ys, ys + resolution) - cy
+            occupied |= dx[:, None] ** 2 + dy[None, :] ** 2 <= radius ** 2
+
+        return cls(occupied, resolution=resolution, origin=(x_min, y_min))
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.resolution).astype(np.int64)
+
+    def clearance(self, point):
+        """
+        :param point    : world coordinates of a point
+        :return         : distance from the center of the point's cell to the nearest occupied cell center, 0 if the
+                          cell is occupied, inf outside the grid or if nothing is occupied
+        """
+        cell = self._cells(np.asarray(point, dtype=float))
+
+        if np.any(cell < 0) or np.any(cell >= self.shape):
+            return math.inf
+
+        return float(self.distance[tuple(cell)])
+
+    def trace(self, start, end):
+        """
+        :param start    : an (k, ndim) array of segment starts
+        :param end      : an (k, ndim) array of segment ends
+        :return         : a boolean array, True where the segment enters no occupied cell
+        """
+        start = np.asarray(start, dtype=float).reshape(-1, self.ndim)
+        end = np.asarray(end, dtype=float).reshape(-1, self.ndim)
+        delta = end - start
+        length = np.sqrt((delta ** 2).sum(axis=1))
+        instrumentation.count('collision.segment_checks', len(start))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            directions = np.where(length[:, None] > 0, delta / length[:, None], 0.0)
+            # a direction of 0 never leaves its cell along that axis, its exit is at inf
+            inverse = np.where(directions != 0, 1.0 / directions, np.inf)
+
+        # the exit of a cell lies on its upper face along axes the segment moves up (or not at all)
+        upper_face = directions >= 0
+        nudge = BOUNDARY_STEP * np.maximum(length, 1.0)
+        high = self.shape - 1
+        strides = np.array([int(np.prod(self.shape[axis + 1:])) for axis in range(self.ndim)])
+        distance = self.distance.ravel()
+
+        free = np.ones(len(start), dtype=bool)
+        active = np.arange(len(start))
+        travelled = np.zeros(len(start))
+
+        # march every segment at once until it is blocked or reaches its end, the state of the segments still
+        # marching is kept compacted
+        while len(active):
+            points = start + directions * np.minimum(travelled, length)[:, None]
+            cells = np.floor((points - self.origin) / self.resolution).astype(np.int64)
+            inside = ((cells >= 0) & (cells <= high)).all(axis=1)
+            field = distance[np.minimum(np.maximum(cells, 0), high) @ strides]
+
+            # an occupied cell has a distance of 0
+            hit = inside & (field == 0)
+            free[active[hit]] = False
+
+            # clear distance proven by the field, outside the grid the distance to the grid is clear
+            outside = np.sqrt((np.maximum(self.origin - points, 0) ** 2
+                               + np.maximum(points - self.upper, 0) ** 2).sum(axis=1))
+            clear = np.where(inside, np.maximum(field - self.margin, 0), outside)
+
+            # distance to the exit of the current cell, which is free when nothing was hit
+            faces = self.origin + (cells + upper_face) * self.resolution
+            exits = np.fmin.reduce((faces - points) * inverse, axis=1)
+
+            keep = ~(hit | (travelled >= length))
+            travelled = travelled + np.maximum(clear, exits) + nudge
+
+            if not keep.all():
+                active, start, directions, inverse, upper_face, length, nudge, travelled = (
+                    v[keep] for v in (active, start, directions, inverse, upper_face, length, nudge, travelled))
+
+        return free
+
+    def segments_free(self, x1, y1, x2, y2):
+        """
+        :param x1, y1   : arrays with the start of every segment
+        :param x2, y2   : arrays with the end of every segment
+        :return         : a boolean array, True where the segment enters no occupied cell
+        """
+        x1, y1, x2, y2 = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x1, y1, x2, y2)))
+        shape = x1.shape
+
+        if self.ndim == 2 and x1.size <= SCALAR_MAX_SEGMENTS:
+            free = [self.segment_free(*segment) for segment in
+                    zip(x1.ravel().tolist(), y1.ravel().tolist(), x2.ravel().tolist(), y2.ravel().tolist())]
+            return np.array(free, dtype=bool).reshape(shape)
+
+        free = self.trace(np.column_stack((x1.ravel(), y1.ravel())), np.column_stack((x2.ravel(), y2.ravel())))
+
+        return free.reshape(shape)
+
+    def segment_free(self, x1, y1, x2, y2):
+        """
+        :param x1, y1   : start of the segment
+        :param x2, y2   : end of the segment
+        :return         : True if the segment enters no occupied cell
+        """
+        # the same march as trace for one segment, plain floats beat the overhead of building arrays
+        instrumentation.count('collision.segment_checks')
+        ox, oy = self.origin.tolist()
+        nx, ny = self.shape.tolist()
+        upper_x, upper_y = self.upper.tolist()
+        res = self.resolution
+
+        dx = x2 - x1
+        dy = y2 - y1
+        length = math.hypot(dx, dy)
+        ux, uy = (dx / length, dy / length) if length > 0 else (0.0, 0.0)
+        nudge = BOUNDARY_STEP * max(length, 1.0)
+        travelled = 0.0
+
+        while True:
+            t = min(travelled, length)
+            px = x1 + ux * t
+            py = y1 + uy * t
+            cx = math.floor((px - ox) / res)
+            cy = math.floor((py - oy) / res)
+
+            if 0 <= cx < nx and 0 <= cy < ny:
+                field = float(self.distance[cx, cy])
+                if field == 0:
+                    return False
+                clear = max(field - self.margin, 0.0)
+            else:
+                clear = math.hypot(max(ox - px, px - upper_x, 0.0), max(oy - py, py - upper_y, 0.0))
+
+            if travelled >= length:
+                return True
+
+            exits = math.inf
+            if ux != 0:
+                exits = ((ox + (cx + (ux > 0)) * res) - px) / ux
+            if uy != 0:
+                exits = min(exits, ((oy + (cy + (uy > 0)) * res) - py) / uy)
+
+            travelled += max(clear, exits) + nudge
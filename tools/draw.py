@@ -1,4 +1,28 @@
+import random
 import matplotlib.pyplot as plt
+from tools import instrumentation
+
+
+def get_random_color(pastel_factor=0.5):
+    return [(x + pastel_factor) / (1.0 + pastel_factor) for x in [random.uniform(0, 1.0) for i in [1, 2, 3]]]
+
+
+def color_distance(c1, c2):
+    return sum([abs(x[0] - x[1]) for x in zip(c1, c2)])
+
+
+def generate_new_color(existing_colors, pastel_factor=0.5):
+    max_distance = None
+    best_color = None
+    for i in range(0, 100):
+        color = get_random_color(pastel_factor=pastel_factor)
+        if not existing_colors:
+            return color
+        best_distance = min([color_distance(color, c) for c in existing_colors])
+        if not max_distance or best_distance > max_distance:
+            max_distance = best_distance
+            best_color = color
+    return best_color
 
 
 class Draw:
@@ -97,8 +121,67 @@ class Draw:
         # this will plot everything
         plt.axis('scaled')
         plt.title(label=self.title)
-        plt.grid(b=True)
+        plt.grid(True)
         plt.show()
 
         # close the figure so other figures can be created
         plt.close(self.env_fig)
+
+
+def render_mission_plan(plan):
+    """
+    :param plan : a MissionPlan returned by uav_ugv_trajectory_generation
+    :return     : a Draw object with the partitions, the UGV tour, the UAV routes and the obstacles drawn
+    """
+    with instrumentation.span('drawing'):
+        picasso = Draw()
+        picasso.title = "2D Top View"
+
+        colors = []
+        for _ in range(len(plan.partitions)):
+            colors.append(generate_new_color(colors, pastel_factor=0.9))
+
+        first_color = colors[0]
+
+        for partition in plan.partitions:
+            edge_color = 'black'
+            order = partition[2]
+            opacity = partition[3]
+            line_width = 3
+
+            bottom_corner = (partition[0][0], partition[1][0])
+            width_x = partition[0][1] - partition[0][0]
+            height_y = partition[1][1] - partition[1][0]
+
+            rectangle = plt.Rectangle \
+                    (
+                    xy=bottom_corner,
+                    width=width_x,
+                    height=height_y,
+                    fill=True,
+                    color=colors.pop(),
+                    ec=edge_color,
+                    lw=line_width,
+                    zorder=order,
+                    alpha=opacity,
+                )
+            picasso.draw.add_patch(rectangle)
+
+        picasso.draw_path(plan.ugv_tour, 'white', width=0.15)
+
+        uav_colors = [first_color]
+
+        for _ in range(len(plan.uav_routes) + 1):
+            uav_colors.append(generate_new_color(colors, pastel_factor=0.3))
+
+        for i, key in enumerate(plan.uav_routes):
+            path = plan.uav_routes[key]
+            picasso.draw_path(path=path, color=uav_colors[i + 1])
+
+        if plan.obstacles:
+
+            for obstacle in plan.obstacles:
+                circle = plt.Circle(obstacle[0], obstacle[1], facecolor='black', zorder=99)
+                picasso.draw.add_patch(circle)
+
+    return picasso
@@ -3,11 +3,23 @@ author : Mohammed Guiga
 email  : guiga004@umn.edu
 """
 import math
-import matplotlib.pyplot as plt
 import numpy as np
 
-# This import registers the 3D projection, but is otherwise unused.
-from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 unused import
+# angle given to a city that sits exactly on the center point
+CENTER_ANGLE = 999
+
+# position code given to a city that sits exactly on the center point
+CENTER_QUADRANT = -1
+
+# voxel type codes stored by a VoxelGrid
+FREE_SPACE = 0
+OBSTACLE = 1
+ROAD = 2
+WATER = 3
+DIRT = 4
+
+VOXEL_CODES = {'free space': FREE_SPACE, 'obstacle': OBSTACLE, 'road': ROAD, 'water': WATER, 'dirt': DIRT}
+VOXEL_TYPES = {code: voxel_type for voxel_type, code in VOXEL_CODES.items()}
 
 
 class Environment:
@@ -29,28 +41,91 @@ class Environment:
 
         # populate cities based on width and height
         # these cities are simply evenly spaced points in a graph
-        self.cities = []
-        self.get_cities
+        self._cities = None
+        self._angles = None
+        self._quadrants = None
+
+    @property
+    def cities(self):
+        """
+        :return : a read-only (N, 2) array with the coordinates of every city
+        """
+        return self.get_cities
 
-    # this will populate a list of cities based on the environment dimensions
+    # this will populate an array of cities based on the environment dimensions
     @property
     def get_cities(self):
 
         # calculate city coordinates if not yet calculated
-        if not self.cities:
+        if self._cities is None:
+            # assumption made that each city is in the center of a square on an mxn grid
+            # the ordering (width major, length minor) matches the original cell by cell loop
+            city_w = np.arange(self.width, dtype=float) + 0.5
+            city_h = np.arange(self.length, dtype=float) + 0.5
 
-            for w in range(self.width):
+            cities = np.column_stack((np.repeat(city_w, self.length), np.tile(city_h, self.width)))
+            cities.setflags(write=False)
 
-                for h in range(self.length):
-                    # these will calculate the cities' coordinates
-                    # assumption made that each city is in the center of a square on an mxn grid
-                    city_w = w + 0.5
-                    city_h = h + 0.5
+            self._cities = cities
 
-                    # add each new city to the list of cities
-                    self.cities.append([city_w, city_h])
+        return self._cities
 
-        return self.cities
+    @property
+    def angles(self):
+        """
+        :return : a read-only array with the angle of every city relative to the reference axis,
+                  CENTER_ANGLE marks a city sitting on the center point
+        """
+        if self._angles is None:
+            self._compute_polar()
+
+        return self._angles
+
+    @property
+    def quadrants(self):
+        """
+        :return : a read-only array with the position code of every city relative to the center,
+                  the codes match Environment.quadrant except the center, which is CENTER_QUADRANT
+        """
+        if self._quadrants is None:
+            self._compute_polar()
+
+        return self._quadrants
+
+    def _compute_polar(self):
+        """
+        :return : N/A, fills the angle and quadrant caches in a single pass over the cities
+        """
+        dx = self.cities[:, 0] - self.center[0]
+        dy = self.cities[:, 1] - self.center[1]
+
+        # arctan2 returns (-pi, pi], shift the lower half plane to get angles in [0, 2pi)
+        angles = np.arctan2(dy, dx)
+        angles = np.where(angles < 0, angles + 2 * np.pi, angles)
+
+        at_center = (dx == 0) & (dy == 0)
+        angles[at_center] = CENTER_ANGLE
+
+        quadrants = np.select(
+            [
+                at_center,
+                (dx > 0) & (dy == 0),
+                (dx > 0) & (dy > 0),
+                (dx == 0) & (dy > 0),
+                (dx < 0) & (dy > 0),
+                (dx < 0) & (dy == 0),
+                (dx < 0) & (dy < 0),
+                (dx == 0) & (dy < 0),
+            ],
+            [CENTER_QUADRANT, 0, 1, 90, 2, 180, 3, 270],
+            default=4,
+        )
+
+        angles.setflags(write=False)
+        quadrants.setflags(write=False)
+
+        self._angles = angles
+        self._quadrants = quadrants
 
     # https://stackoverflow.com/questions/2827393/angles-between-two-n-dimensional-vectors-in-python/13849249#13849249
     @staticmethod
@@ -124,9 +199,9 @@ class Environment:
         :return         : the angle of that point relative to the reference axis
         """
 
-        # edge case for the center
-        if point == self.center:
-            return 999
+        # edge case for the center, point may be a row of the cities array
+        if np.array_equal(point, self.center):
+            return CENTER_ANGLE
 
         # calculate the position of the point for a few corner cases
         position = Environment.quadrant(self, point)
@@ -152,6 +227,147 @@ class Environment:
                 return angle
 
 
+class VoxelGrid:
+    """
+    A dense voxel map, one uint8 type code (see VOXEL_CODES) per 1x1x1 voxel, indexed by its bottom corner [x, y, z].
+
+    Every voxel not assigned a type is free space. The codes can live in a .npy file opened as a memory map, so maps
+    larger than memory are only paged in where they are read.
+    """
+
+    def __init__(self, x_max, y_max, z_max, path=None):
+        """
+        :param x_max    : largest x corner in the map
+        :param y_max    : largest y corner in the map
+        :param z_max    : largest z corner in the map
+        :param path     : optional .npy file the codes are stored in, overwritten if it exists
+        """
+        shape = (x_max + 1, y_max + 1, z_max + 1)
+
+        if path is None:
+            self.codes = np.zeros(shape, dtype=np.uint8)
+        else:
+            # a new .npy file is zero filled, which is free space
+            self.codes = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+
+    @classmethod
+    def from_known_voxels(cls, known_voxels, specs, path=None):
+        """
+        :param known_voxels : {voxel type: entries}, entries are [x, y, z] corners or [(x, y), radius] circles, a
+                              circle fills every voxel column it overlaps
+        :param specs        : environment specs with x_max, y_max and z_max
+        :param path         : optional .npy file the codes are stored in
+        :return             : a VoxelGrid with the known voxels assigned, the first type listed wins a shared voxel
+        """
+        grid = cls(specs['x_max'], specs['y_max'], specs['z_max'], path=path)
+
+        for voxel_type, entries in reversed(list(known_voxels.items())):
+            if voxel_type not in VOXEL_CODES:
+                raise ValueError(f'unknown voxel type {voxel_type}')
+
+            corners = [entry for entry in entries if len(entry) == 3]
+            circles = [entry for entry in entries if len(entry) == 2]
+
+            grid.assign(corners, voxel_type)
+            grid.assign_circles(circles, voxel_type)
+
+        return grid
+
+    @classmethod
+    def load(cls, path, mode='r'):
+        """
+        :param path : a .npy file written by a VoxelGrid
+        :param mode : memory map mode, 'r+' allows the map to be changed
+        :return     : a VoxelGrid backed by the file
+        """
+        grid = cls.__new__(cls)
+        grid.codes = np.load(path, mmap_mode=mode)
+
+        return grid
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def __len__(self):
+        return self.codes.size
+
+    def __iter__(self):
+        # Voxel objects in the order Voxel.create_voxels used to list them, z, then y, then x
+        for z in range(self.shape[2]):
+            for y in range(self.shape[1]):
+                for x, code in enumerate(self.codes[:, y, z].tolist()):
+                    yield Voxel(bottom_corner=[x, y, z], voxel_type=VOXEL_TYPES[code])
+
+    def __getitem__(self, corner):
+        """
+        :param corner   : [x, y, z] bottom corner of a voxel, or index arrays for many voxels at once
+        :return         : the type code(s)
+        """
+        return self.codes[tuple(corner)]
+
+    def inside(self, corners):
+        """
+        :param corners  : an (k, 3) array of bottom corners
+        :return         : a boolean array, True where the corner lies in the map
+        """
+        corners = np.asarray(corners).reshape(-1, 3)
+
+        return np.all((corners >= 0) & (corners < np.array(self.shape)), axis=1)
+
+    def assign(self, corners, voxel_type):
+        """
+        :param corners      : a list of [x, y, z] bottom corners, corners outside the map are ignored
+        :param voxel_type   : the type given to the voxels
+        """
+        corners = np.asarray(corners, dtype=np.int64).reshape(-1, 3)
+        corners = corners[self.inside(corners)]
+
+        self.codes[corners[:, 0], corners[:, 1], corners[:, 2]] = VOXEL_CODES[voxel_type]
+
+    def assign_circles(self, circles, voxel_type):
+        """
+        :param circles      : a list of [(x, y), radius] circles
+        :param voxel_type   : the type given to every voxel column a circle overlaps
+        """
+        for (cx, cy), radius in circles:
+            x_lo = max(0, math.floor(cx - radius))
+            x_hi = min(self.shape[0], math.ceil(cx + radius))
+            y_lo = max(0, math.floor(cy - radius))
+            y_hi = min(self.shape[1], math.ceil(cy + radius))
+
+            if x_lo >= x_hi or y_lo >= y_hi:
+                continue
+
+            # distance from the center to the closest point of each unit cell
+            xs = np.arange(x_lo, x_hi)
+            ys = np.arange(y_lo, y_hi)
+            dx = np.clip(cx, xs, xs + 1) - cx
+            dy = np.clip(cy, ys, ys + 1) - cy
+            overlap = dx[:, None] ** 2 + dy[None, :] ** 2 < radius ** 2
+
+            self.codes[x_lo:x_hi, y_lo:y_hi][overlap] = VOXEL_CODES[voxel_type]
+
+    def voxel_type(self, corner):
+        """
+        :param corner   : [x, y, z] bottom corner of a voxel
+        :return         : the name of the voxel's type
+        """
+        return VOXEL_TYPES[int(self.codes[tuple(corner)])]
+
+    def mask(self, voxel_type):
+        """
+        :param voxel_type   : a voxel type name
+        :return             : a boolean array, True where the voxel has this type
+        """
+        return self.codes == VOXEL_CODES[voxel_type]
+
+    def flush(self):
+        # writes a memory mapped grid back to its file
+        if isinstance(self.codes, np.memmap):
+            self.codes.flush()
+
+
 class Voxel:
     # each voxel represents a 1x1x1 3D environment space
     def __init__(self, bottom_corner, voxel_type, identity=None):
@@ -160,31 +376,9 @@ class Voxel:
         self.identity = identity            # the identity ex. 'tree'
 
     @staticmethod
-    def create_voxels(known_voxels, specs):
-        # remove empty voxel types for efficiency
-        Voxel.delete_empty_keys(known_voxels)
-
-        # create all of the Voxel objects and store them in a voxels list
-        voxel_corners = []
-        types = []
-        expanded_voxels = []
-
-        for key, values in known_voxels.items():
-            for value in values:
-                voxel_corners.append(value)
-                types.append(key)
-
-        for z in range(specs['z_max'] + 1):
-            for y in range(specs['y_max'] + 1):
-                for x in range(specs['x_max'] + 1):
-
-                    point = [x, y, z]
-                    if [x, y, z] in voxel_corners:
-                        expanded_voxels.append(Voxel(bottom_corner=point, voxel_type=types[voxel_corners.index(point)]))
-                    else:
-                        expanded_voxels.append(Voxel(bottom_corner=point, voxel_type='free space'))
-
-        return expanded_voxels
+    def create_voxels(known_voxels, specs, path=None):
+        # the voxels are held as type codes in a VoxelGrid, iterating over it still yields Voxel objects
+        return VoxelGrid.from_known_voxels(known_voxels, specs, path=path)
 
     @staticmethod
     def delete_empty_keys(dict_obj):
@@ -205,6 +399,7 @@ class Voxel:
 
     @staticmethod
     def draw_voxels(a, b, c, color='#FFD65DC0'):
+        import matplotlib.pyplot as plt
 
         # prepare some coordinates
         max_dim = max(a, b, c)
@@ -222,7 +417,7 @@ class Voxel:
 
         # and plot everything
         fig = plt.figure()
-        ax = fig.gca(projection='3d')
+        ax = fig.add_subplot(projection='3d')
         ax.voxels(voxels, facecolors=colors, edgecolor='k')
 
         plt.title('3D Voxel Environment')
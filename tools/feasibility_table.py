@@ -0,0 +1,163 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+"""
+import os
+import tempfile
+import numpy as np
+from tools.environment import Environment
+import tools.guiga_algorithms as gumo
+from tools import instrumentation
+
+
+def partition_max_path(width, length, n):
+    """
+    :param width    : width of the partition
+    :param length   : length of the partition
+    :param n        : number of UAVs
+    :return         : the longest UAV route when the partition is split among the UAVs
+    """
+    uav_paths, split = gumo.get_uav_paths(environment=Environment(width=width, length=length), number_of_uavs=n)
+
+    return gumo.calculate_route_data(uav_paths)
+
+
+class FeasibilityTable:
+    """
+    An on-disk table holding the max UAV path length of every partition size, indexed by [n, width, length].
+
+    The max path length only depends on the partition size and the number of UAVs, so it is computed once and
+    stored in a memory-mapped .npy file. Energy parameters are applied by the caller, so the table stays valid when
+    the hardware specs change. Entries that have not been computed yet hold NaN.
+
+    Several processes may open the same file, every entry they fill in is visible to the others. Growing the table
+    replaces the file, entries written by other processes to the old file after that point are lost and simply get
+    recomputed later.
+    """
+
+    def __init__(self, path, max_width=32, max_length=32, max_uavs=8, compute=partition_max_path):
+        """
+        :param path         : location of the .npy file backing the table, created if it does not exist
+        :param max_width    : initial width capacity of the table
+        :param max_length   : initial length capacity of the table
+        :param max_uavs     : initial capacity for the number of UAVs
+        :param compute      : function (width, length, n) -> max path length used to fill missing entries
+        """
+        self.path = path
+        self.compute = compute
+        self.shape = (max_uavs + 1, max_width + 1, max_length + 1)
+
+        self._table = None
+
+    def __getstate__(self):
+        # the memory map is reopened by each process
+        state = self.__dict__.copy()
+        state['_table'] = None
+        return state
+
+    def __contains__(self, key):
+        width, length, n = key
+        table = self._open()
+
+        if not self._in_bounds(table, width, length, n):
+            return False
+
+        return not np.isnan(table[n, width, length])
+
+    def max_path(self, width, length, n):
+        """
+        :param width    : width of the partition
+        :param length   : length of the partition
+        :param n        : number of UAVs
+        :return         : the max UAV path length, computed and stored if it is not in the table yet
+        """
+        table = self._open()
+
+        if not self._in_bounds(table, width, length, n):
+            # another process may have grown the table already
+            table = self._open(reload=True)
+
+            if not self._in_bounds(table, width, length, n):
+                table = self._grow(width, length, n)
+
+        value = table[n, width, length]
+
+        if np.isnan(value):
+            instrumentation.count('feasibility_table.misses')
+            value = self.compute(width, length, n)
+            table[n, width, length] = value
+            table.flush()
+        else:
+            instrumentation.count('feasibility_table.hits')
+
+        return float(value)
+
+    @staticmethod
+    def _in_bounds(table, width, length, n):
+        return n < table.shape[0] and width < table.shape[1] and length < table.shape[2]
+
+    def _open(self, reload=False):
+        """
+        :param reload   : reopen the file even if it is already mapped
+        :return         : the memory-mapped table
+        """
+        if self._table is not None and not reload:
+            return self._table
+
+        if not os.path.exists(self.path):
+            self._create(self.shape)
+
+        self._table = np.lib.format.open_memmap(self.path, mode='r+')
+        self.shape = self._table.shape
+
+        return self._table
+
+    def _create(self, shape, contents=None):
+        """
+        :param shape    : shape of the new table
+        :param contents : an existing table copied into the new one
+        :return         : N/A, the file is written under a temporary name and then moved into place
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(suffix='.npy', dir=directory)
+        os.close(handle)
+
+        try:
+            table = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float64, shape=shape)
+            table[:] = np.nan
+
+            if contents is not None:
+                table[:contents.shape[0], :contents.shape[1], :contents.shape[2]] = contents
+
+            table.flush()
+            del table
+
+            if contents is None:
+                # never overwrite a table that another process has just created
+                try:
+                    os.link(temp_path, self.path)
+                except FileExistsError:
+                    pass
+            else:
+                os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _grow(self, width, length, n):
+        """
+        :return : the memory-mapped table, enlarged so that [n, width, length] fits
+        """
+        current = self._open()
+
+        # double the capacity so that a sweep does not grow the table on every step
+        shape = tuple(max(size, 2 * index + 1) if index >= size else size
+                      for size, index in zip(current.shape, (n, width, length)))
+
+        contents = np.array(current)
+        self._table = None
+        del current
+
+        self._create(shape, contents)
+
+        return self._open(reload=True)
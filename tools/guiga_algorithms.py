@@ -2,11 +2,78 @@
 author : Mohammed Guiga
 email  : guiga004@umn.edu
 """
-import math
 import numpy as np
+from tools.environment import CENTER_ANGLE
+from tools.routes import pack_routes, route_lengths, path_length
 from tsp_algorithms.tsp_algorithms import exact_tsp
 
 
+def sector_boundaries(number_of_uavs):
+    """
+    :param number_of_uavs   : the number of uavs (k)
+    :return                 : the angles splitting the environment, starting at 0 and ending at 2*pi
+    """
+    # this will hold all of the angles that split up the environment
+    angles = [np.radians(num * (360 / number_of_uavs)) for num in range(number_of_uavs)]
+
+    # append 2*pi to include the points belonging to the last drone
+    angles.append(np.radians(360))
+
+    return np.array(angles)
+
+
+def assign_uav_sectors(environment, number_of_uavs):
+    """
+    :param environment      : an instance of the Environment class
+    :param number_of_uavs   : the number of uavs (k)
+    :return                 : a dictionary mapping each uav number (1 to k) to an integer array of the indices
+                              of the cities it visits, ordered by angle
+
+    Each city belongs to the sector whose boundary angles enclose it. Sectors are filled counter-clockwise and
+    once a sector holds the optimal split any remaining cities overflow into the next sector, except for the last
+    sector which takes everything left over.
+    """
+    boundaries = sector_boundaries(number_of_uavs)
+    optimal_split = round(len(environment.cities) / number_of_uavs)
+
+    # sort the cities by their angle, don't care about the center since we are starting at the center
+    city_angles = environment.angles
+    order = np.argsort(city_angles, kind='stable')
+    order = order[city_angles[order] != CENTER_ANGLE]
+
+    # sector i holds the cities with boundaries[i - 1] <= angle < boundaries[i]
+    sectors = np.searchsorted(boundaries, city_angles[order], side='right')
+    counts = np.bincount(sectors, minlength=number_of_uavs + 1)[1:]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # number of each sector's own cities that stay in it, the rest spill over into the next sector
+    kept = counts.copy()
+    overflow = 0
+
+    for i in range(number_of_uavs - 1):
+        if overflow:
+            kept[i] = min(counts[i], max(optimal_split - overflow, 0))
+        else:
+            # the first city always opens the sector, even if the optimal split is zero
+            kept[i] = min(counts[i], max(optimal_split, 1))
+
+        overflow = counts[i] - kept[i]
+
+    # rank of each city within its own sector decides whether it overflows
+    ranks = np.arange(len(order)) - starts[sectors - 1]
+    labels = sectors + (ranks >= kept[sectors - 1])
+
+    uav_sectors = {}
+
+    for uav in range(1, number_of_uavs + 1):
+        indices = order[labels == uav]
+
+        if len(indices):
+            uav_sectors[uav] = indices
+
+    return uav_sectors
+
+
 def get_uav_paths(environment, number_of_uavs):
     """
     :param environment      : an instance of the Environment class
@@ -15,19 +82,12 @@ def get_uav_paths(environment, number_of_uavs):
     """
     # these should correspond for each uav
     rotated_points = []
-    angles = []
 
     # this will hold the points that each uav will visit
     uav_paths = {}
 
-    for num in range(number_of_uavs):
+    for theta in sector_boundaries(number_of_uavs)[:-1]:
         # create a rotation matrix to find the initial paths of all of the uavs
-        # increase the angle each iteration
-        angle = 360 / number_of_uavs
-        theta = np.radians(num * angle)
-
-        # this will hold all of the angles that split up the environment
-        angles.append(theta)
         c, s = np.cos(theta), np.sin(theta)
 
         # create a rotation matrix
@@ -41,72 +101,28 @@ def get_uav_paths(environment, number_of_uavs):
         rotated_point = rot_point + environment.center
         rotated_points.append(list(rotated_point))
 
-    # append 2*pi to include the points belonging to the last drone
-    angles.append(np.radians(360))
-
-    optimal_split = round(len(environment.cities) / (len(angles) - 1))
-
-    # sort the cities by their angle
-    for city in environment.cities:
-        city.append(environment.find_angle_from_center(city))
-
-    environment.cities = sorted(environment.cities, key=lambda e: e[2], reverse=False)
-
-    # calculate the angle of each point and assign them to a respective drone
-    for city in environment.cities:
-
-        city_angle = city[2]
-
-        # don't care about the center since we are starting at the center
-        if city_angle != 999:
-
-            for i, angle in enumerate(angles):
+    for uav, indices in assign_uav_sectors(environment, number_of_uavs).items():
+        route = environment.cities[indices].tolist()
 
-                # assign points by iterating counter-clockwise through environment
-                if city_angle < angle != 0:
+        route.insert(0, environment.center)  # make the center point the starting point
+        route = exact_tsp(route)  # run tsp on each route
+        route.append(route[0])  # have each uav travel back to the center point
 
-                    # create a key in the dictionary if not yet created+
-                    if f'{i}' not in uav_paths.keys():
-                        uav_paths.update({f'{i}': [city[:2]]})
-
-                    else:
-
-                        if len(uav_paths[f'{i}']) < optimal_split or angle == angles[-1]:
-                            uav_paths[f'{i}'].append(city[:2])
-
-                        else:
-
-                            if f'{i + 1}' not in uav_paths.keys():
-                                uav_paths.update({f'{i + 1}': [city[:2]]})
-                            else:
-                                uav_paths[f'{i + 1}'].append(city[:2])
-
-                    break
-
-    for key in uav_paths:
-        uav_paths[key].insert(0, environment.center)  # make the center point the starting point
-        uav_paths[key] = exact_tsp(uav_paths[key])  # run tsp on each route
-        uav_paths[key].append(uav_paths[key][0])  # have each uav travel back to the center point
+        uav_paths[f'{uav}'] = route
 
     return uav_paths, rotated_points
 
 
-def get_path_length(path):
+def get_path_length(path, distances=None):
     """
-    :param path : a list of points
-    :return     : the path length
+    :param path      : a list of points, or a list of city indices when distances is given
+    :param distances : an optional DistanceMatrix the indices in path refer to
+    :return          : the path length
     """
-    path_length = 0
+    if distances is not None:
+        return distances.path_length(path)
 
-    for v in range(len(path) - 1):
-        x = path[v][0]
-        y = path[v][1]
-        dx = path[v + 1][0] - x
-        dy = path[v + 1][1] - y
-
-        path_length += math.hypot(dx, dy)
-
-    return path_length
+    return path_length(path)
 
 
 def calculate_route_data(uav_paths):
@@ -114,14 +130,10 @@ def calculate_route_data(uav_paths):
     :param uav_paths   : a dictionary containing all UAV routes
     :return:           : a dictionary containing stats for the UAV with the max path length
     """
+    if not uav_paths:
+        return 0
 
-    max_path = 0
-
-    for uav, path in uav_paths.items():
-
-        path_length = get_path_length(path)
-
-        if path_length > max_path:
-            max_path = path_length
+    # measure every route in one pass
+    max_path = route_lengths(*pack_routes(list(uav_paths.values())))[1]
 
     return max_path
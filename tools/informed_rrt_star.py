@@ -9,32 +9,119 @@ Direct Sampling of an Admissible Ellipsoidal Heuristichttps://arxiv.org/pdf/1404
 
 """
 
-import copy
+import itertools
 import math
 import random
+import time
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from tools import instrumentation
+from tools.collision import CircleObstacles
+from tools.routes import path_length
+from tools.rrt_trace import TraceWriter
+from tools.spatial_index import GridIndex
+
+# parent index of the root node
+NO_PARENT = -1
+
+
 class InformedRRTStar:
 
     def __init__(self, start, goal,
                  obstacleList, randArea,
-                 expandDis=0.5, goalSampleRate=10, maxIter=200):
+                 expandDis=0.5, goalSampleRate=10, maxIter=200, collision=None, rng=None):
+        # collision is an optional backend with segment_free and segments_free, such as a
+        # tools.distance_field.DistanceField, by default the circles in obstacleList are tested analytically
+        # rng is an optional random.Random the samples are drawn from, by default the global random module
+        # randArea is [min, max] for a square sampling area or [x min, x max, y min, y max] for a rectangle
 
         self.start = Node(start[0], start[1])
         self.goal = Node(goal[0], goal[1])
-        self.min_rand = randArea[0]
-        self.max_rand = randArea[1]
+        self.rand_area = list(randArea) if len(randArea) == 4 else list(randArea) * 2
         self.expand_dis = expandDis
         self.goal_sample_rate = goalSampleRate
         self.max_iter = maxIter
         self.obstacle_list = obstacleList
-        self.node_list = None
-
-    def informed_rrt_star_search(self, animation=True):
-
-        self.node_list = [self.start]
+        self.collision = CircleObstacles(obstacleList) if collision is None else collision
+        self.tree = None
+        self.node_index = None
+        self.trace = None
+        self.iteration = 0
+        self.stats = None
+        self.random = random if rng is None else rng
+
+    @property
+    def node_list(self):
+        # the tree as a list of Node objects, built on demand
+        if self.tree is None:
+            return None
+
+        return self.tree.nodes()
+
+    def informed_rrt_star_search(self, animation=False, trace=None):
+        # animation draws the tree with matplotlib on every iteration, which dominates the run time
+        # trace is an optional file the search events are recorded to, see tools.rrt_trace.replay_trace
+        # runs exactly maxIter iterations, the search statistics are left in self.stats
+        return self._run(animation, trace, self.max_iter, None, None, 0.0)
+
+    def anytime_search(self, time_budget=None, stall_iterations=None, stall_epsilon=0.0, max_iter=None,
+                       animation=False, trace=None):
+        """
+        :param time_budget      : wall-clock seconds the search may run for
+        :param stall_iterations : stop once a solution exists and cBest has not improved for this many iterations
+        :param stall_epsilon    : improvements smaller than this fraction of cBest do not count as progress
+        :param max_iter         : iteration cap, None runs until the time budget or the stall criterion stops it,
+                                  at least one of max_iter and time_budget is required
+        :param animation        : draw the tree on every iteration
+        :param trace            : optional file the search events are recorded to
+        :return                 : the best path found so far (None if there is none) and a dictionary of stats
+                                  with iterations, nodes, time, time_to_first_solution, cbest_history and
+                                  stop_reason
+        """
+        # the stall criterion only starts counting once a solution exists, alone it never stops an unreachable goal
+        if max_iter is None and time_budget is None:
+            raise ValueError('anytime_search needs a time budget or an iteration cap')
+
+        path = self._run(animation, trace, max_iter, time_budget, stall_iterations, stall_epsilon)
+
+        return path, self.stats
+
+    def _run(self, animation, trace, max_iter, time_budget, stall_iterations, stall_epsilon):
+        if trace is not None:
+            self.trace = TraceWriter(trace, {
+                'start': [self.start.x, self.start.y],
+                'goal': [self.goal.x, self.goal.y],
+                'obstacles': [list(obstacle) for obstacle in self.obstacle_list],
+                'randArea': self.rand_area,
+            })
+
+        try:
+            with instrumentation.span('informed_rrt_star'):
+                return self._search(animation, max_iter, time_budget, stall_iterations, stall_epsilon)
+        finally:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
+
+    def _search(self, animation, max_iter, time_budget, stall_iterations, stall_epsilon):
+        started = time.perf_counter()
+        self.stats = {
+            'iterations': 0,
+            'nodes': 1,
+            'time': 0.0,
+            'time_to_first_solution': None,
+            'cbest_history': [],
+            'stop_reason': 'max_iter',
+        }
+        # iterations since cBest last improved by more than stall_epsilon
+        stalled = 0
+
+        self.tree = NodeTree()
+        self.tree.add(self.start.x, self.start.y, self.start.cost)
+        # the spatial index numbers the nodes in the same order as the tree
+        self.node_index = GridIndex(cell_size=self.expand_dis)
+        self.node_index.insert(self.start.x, self.start.y)
         # max length we expect to find in our 'informed' sample space, starts as infinite
         cBest = float('inf')
         solutionSet = set()
@@ -48,7 +135,7 @@ class InformedRRTStar:
         a1 = np.array([[(self.goal.x - self.start.x) / cMin],
                        [(self.goal.y - self.start.y) / cMin], [0]])
 
-        etheta = math.atan2(a1[1], a1[0])
+        etheta = math.atan2(a1[1, 0], a1[0, 0])
         # first column of idenity matrix transposed
         id1_t = np.array([1.0, 0.0, 0.0]).reshape(1, 3)
         M = a1 @ id1_t
@@ -56,15 +143,26 @@ class InformedRRTStar:
         C = np.dot(np.dot(U, np.diag(
             [1.0, 1.0, np.linalg.det(U) * np.linalg.det(np.transpose(Vh))])), Vh)
 
-        for i in range(self.max_iter):
+        for i in (range(max_iter) if max_iter is not None else itertools.count()):
+            if time_budget is not None and time.perf_counter() - started >= time_budget:
+                self.stats['stop_reason'] = 'time_budget'
+                break
+            if stall_iterations is not None and path is not None and stalled >= stall_iterations:
+                self.stats['stop_reason'] = 'stalled'
+                break
+            stalled += 1
+
             # Sample space is defined by cBest
             # cMin is the minimum distance between the start point and the goal
             # xCenter is the midpoint between the start and the goal
             # cBest changes when a new path is found
+            self.iteration = i
 
             rnd = self.informed_sample(cBest, cMin, xCenter, C)
-            nind = self.get_nearest_list_index(self.node_list, rnd)
-            nearestNode = self.node_list[nind]
+            if self.trace is not None:
+                self.trace.sample(i, rnd[0], rnd[1])
+            nind = self.node_index.nearest(rnd[0], rnd[1])
+            nearestNode = self.tree.node(nind)
             # steer
             theta = math.atan2(rnd[1] - nearestNode.y, rnd[0] - nearestNode.x)
             newNode = self.get_new_node(theta, nind, nearestNode)
@@ -76,45 +174,62 @@ class InformedRRTStar:
                 nearInds = self.find_near_nodes(newNode)
                 newNode = self.choose_parent(newNode, nearInds)
 
-                self.node_list.append(newNode)
+                newIndex = self.tree.add(newNode.x, newNode.y, newNode.cost, newNode.parent)
+                self.node_index.insert(newNode.x, newNode.y)
+                if self.trace is not None:
+                    self.trace.node(i, newIndex, newNode.parent, newNode.x, newNode.y, newNode.cost)
                 self.rewire(newNode, nearInds)
 
                 if self.is_near_goal(newNode):
                     if self.check_segment_collision(newNode.x, newNode.y, self.goal.x , self.goal.y):
                         solutionSet.add(newNode)
-                        lastIndex = len(self.node_list) - 1
+                        lastIndex = len(self.tree) - 1
                         tempPath = self.get_final_course(lastIndex)
                         tempPathLen = self.get_path_len(tempPath)
                         if tempPathLen < cBest:
+                            if cBest - tempPathLen > stall_epsilon * tempPathLen:
+                                stalled = 0
                             path = tempPath
                             cBest = tempPathLen
+                            elapsed = time.perf_counter() - started
+                            if self.stats['time_to_first_solution'] is None:
+                                self.stats['time_to_first_solution'] = elapsed
+                            self.stats['cbest_history'].append((i, elapsed, cBest))
+                            if self.trace is not None:
+                                self.trace.cbest(i, cBest)
             if animation:
                 self.draw_graph(xCenter=xCenter,
                                 cBest=cBest, cMin=cMin,
                                 etheta=etheta, rnd=rnd)
 
+            self.stats['iterations'] = i + 1
+
+        self.stats['nodes'] = len(self.tree)
+        self.stats['time'] = time.perf_counter() - started
+        instrumentation.count('rrt.searches')
+        instrumentation.count('rrt.iterations', self.stats['iterations'])
+        instrumentation.count('rrt.nodes', self.stats['nodes'])
+
         return path
 
     def choose_parent(self, newNode, nearInds):
         if len(nearInds) == 0:
             return newNode
 
-        dList = []
-        for i in nearInds:
-            dx = newNode.x - self.node_list[i].x
-            dy = newNode.y - self.node_list[i].y
-            d = math.hypot(dx, dy)
-            theta = math.atan2(dy, dx)
-            if self.check_collision(self.node_list[i], theta, d):
-                dList.append(self.node_list[i].cost + d)
-            else:
-                dList.append(float('inf'))
+        # cost of reaching the new node through every near node, infinite where the edge collides
+        nearInds = np.asarray(nearInds)
+        nearX = self.tree.x[nearInds]
+        nearY = self.tree.y[nearInds]
+        dList = np.hypot(newNode.x - nearX, newNode.y - nearY)
+        noCollision = self.check_segments_collision(nearX, nearY, newNode.x, newNode.y)
+        costs = np.where(noCollision, self.tree.cost[nearInds] + dList, float('inf'))
 
-        minCost = min(dList)
-        minInd = nearInds[dList.index(minCost)]
+        best = int(np.argmin(costs))
+        minCost = float(costs[best])
+        minInd = int(nearInds[best])
 
         if minCost == float('inf'):
-            print("mincost is inf")
+            instrumentation.count('rrt.unreachable_near_nodes')
             return newNode
 
         newNode.cost = minCost
@@ -123,12 +238,9 @@ class InformedRRTStar:
         return newNode
 
     def find_near_nodes(self, newNode):
-        nnode = len(self.node_list)
+        nnode = len(self.tree)
         r = 50.0 * math.sqrt((math.log(nnode) / nnode))
-        dlist = [(node.x - newNode.x) ** 2
-                 + (node.y - newNode.y) ** 2 for node in self.node_list]
-        nearinds = [dlist.index(i) for i in dlist if i <= r ** 2]
-        return nearinds
+        return self.node_index.within(newNode.x, newNode.y, r)
 
     def informed_sample(self, cMax, cMin, xCenter, C):
         if cMax < float('inf'):
@@ -144,10 +256,9 @@ class InformedRRTStar:
 
         return rnd
 
-    @staticmethod
-    def sample_unit_ball():
-        a = random.random()
-        b = random.random()
+    def sample_unit_ball(self):
+        a = self.random.random()
+        b = self.random.random()
 
         if b < a:
             a, b = b, a
@@ -157,9 +268,9 @@ class InformedRRTStar:
         return np.array([[sample[0]], [sample[1]], [0]])
 
     def sample_free_space(self):
-        if random.randint(0, 100) > self.goal_sample_rate:
-            rnd = [random.uniform(self.min_rand, self.max_rand),
-                   random.uniform(self.min_rand, self.max_rand)]
+        if self.random.randint(0, 100) > self.goal_sample_rate:
+            rnd = [self.random.uniform(self.rand_area[0], self.rand_area[1]),
+                   self.random.uniform(self.rand_area[2], self.rand_area[3])]
         else:
             rnd = [self.goal.x, self.goal.y]
 
@@ -167,35 +278,17 @@ class InformedRRTStar:
 
     @staticmethod
     def get_path_len(path):
-        pathLen = 0
-        for i in range(1, len(path)):
-            node1_x = path[i][0]
-            node1_y = path[i][1]
-            node2_x = path[i - 1][0]
-            node2_y = path[i - 1][1]
-            pathLen += math.sqrt((node1_x - node2_x)
-                                 ** 2 + (node1_y - node2_y) ** 2)
-
-        return pathLen
+        return path_length(path)
 
     @staticmethod
     def line_cost(node1, node2):
         return math.sqrt((node1.x - node2.x) ** 2 + (node1.y - node2.y) ** 2)
 
-    @staticmethod
-    def get_nearest_list_index(nodes, rnd):
-        dList = [(node.x - rnd[0]) ** 2
-                 + (node.y - rnd[1]) ** 2 for node in nodes]
-        minIndex = dList.index(min(dList))
-        return minIndex
-
     def get_new_node(self, theta, nind, nearestNode):
-        newNode = copy.deepcopy(nearestNode)
-
-        newNode.x += self.expand_dis * math.cos(theta)
-        newNode.y += self.expand_dis * math.sin(theta)
+        newNode = Node(nearestNode.x + self.expand_dis * math.cos(theta),
+                       nearestNode.y + self.expand_dis * math.sin(theta))
 
-        newNode.cost += self.expand_dis
+        newNode.cost = nearestNode.cost + self.expand_dis
         newNode.parent = nind
         return newNode
 
@@ -206,63 +299,54 @@ class InformedRRTStar:
         return False
 
     def rewire(self, newNode, nearInds):
-        n_node = len(self.node_list)
-        for i in nearInds:
-            nearNode = self.node_list[i]
+        n_node = len(self.tree)
+        if len(nearInds) == 0:
+            return
 
-            d = math.sqrt((nearNode.x - newNode.x) ** 2
-                          + (nearNode.y - newNode.y) ** 2)
+        nearInds = np.asarray(nearInds)
+        nearX = self.tree.x[nearInds]
+        nearY = self.tree.y[nearInds]
+        scost = newNode.cost + np.hypot(nearX - newNode.x, nearY - newNode.y)
 
-            scost = newNode.cost + d
+        # only the near nodes that get cheaper through the new node need a collision check
+        better = self.tree.cost[nearInds] > scost
+        if not better.any():
+            return
 
-            if nearNode.cost > scost:
-                theta = math.atan2(newNode.y - nearNode.y,
-                                   newNode.x - nearNode.x)
-                if self.check_collision(nearNode, theta, d):
-                    nearNode.parent = n_node - 1
-                    nearNode.cost = scost
+        noCollision = self.check_segments_collision(nearX[better], nearY[better], newNode.x, newNode.y)
+        rewired = nearInds[better][noCollision]
 
-    @staticmethod
-    def distance_squared_point_to_segment(v, w, p):
-        # Return minimum distance between line segment vw and point p
-        if (np.array_equal(v, w)):
-            return (p-v).dot(p-v) # v == w case
-        l2 = (w-v).dot(w-v) # i.e. |w-v|^2 -  avoid a sqrt
-        # Consider the line extending the segment, parameterized as v + t (w - v).
-        # We find projection of point p onto the line.
-        # It falls where t = [(p-v) . (w-v)] / |w-v|^2
-        # We clamp t from [0,1] to handle points outside the segment vw.
-        t = max(0, min(1, (p - v).dot(w - v) / l2))
-        projection = v + t * (w - v) # Projection falls on the segment
-        return (p-projection).dot(p-projection)
+        self.tree.parent[rewired] = n_node - 1
+        self.tree.cost[rewired] = scost[better][noCollision]
+
+        if self.trace is not None:
+            self.trace.rewire(self.iteration, rewired, n_node - 1, self.tree.cost[rewired])
 
     def check_segment_collision(self, x1, y1, x2, y2):
-        for (ox, oy, size) in self.obstacle_list:
-            dd = self.distance_squared_point_to_segment(
-                np.array([x1, y1]),
-                np.array([x2, y2]),
-                np.array([ox, oy]))
-            if dd <= size**2:
-                return False  # collision
-        return True
+        # False means the segment collides with an obstacle
+        return self.collision.segment_free(x1, y1, x2, y2)
+
+    def check_segments_collision(self, x1, y1, x2, y2):
+        # batched check_segment_collision, takes arrays and returns a boolean array
+        return self.collision.segments_free(x1, y1, x2, y2)
 
 
     def check_collision(self, nearNode, theta, d):
-        tmpNode = copy.deepcopy(nearNode)
-        endx = tmpNode.x + math.cos(theta)*d
-        endy = tmpNode.y + math.sin(theta)*d
-        return self.check_segment_collision(tmpNode.x, tmpNode.y, endx, endy)
+        endx = nearNode.x + math.cos(theta)*d
+        endy = nearNode.y + math.sin(theta)*d
+        return self.check_segment_collision(nearNode.x, nearNode.y, endx, endy)
 
     def get_final_course(self, lastIndex):
         path = [[self.goal.x, self.goal.y]]
-        while self.node_list[lastIndex].parent is not None:
-            node = self.node_list[lastIndex]
-            path.append([node.x, node.y])
-            lastIndex = node.parent
+        while self.tree.parent[lastIndex] != NO_PARENT:
+            path.append([float(self.tree.x[lastIndex]), float(self.tree.y[lastIndex])])
+            lastIndex = self.tree.parent[lastIndex]
         path.append([self.start.x, self.start.y])
         return path
 
     def draw_graph(self, xCenter=None, cBest=None, cMin=None, etheta=None, rnd=None):
+        import matplotlib.pyplot as plt
+
         plt.clf()
         # for stopping simulation with the esc key.
         plt.gcf().canvas.mpl_connect('key_release_event',
@@ -272,11 +356,10 @@ class InformedRRTStar:
             if cBest != float('inf'):
                 self.plot_ellipse(xCenter, cBest, cMin, etheta)
 
-        for node in self.node_list:
-            if node.parent is not None:
-                if node.x or node.y is not None:
-                    plt.plot([node.x, self.node_list[node.parent].x], [
-                        node.y, self.node_list[node.parent].y], "-g")
+        tree = self.tree.export()
+        for x, y, parent in zip(tree['x'], tree['y'], tree['parent']):
+            if parent != NO_PARENT:
+                plt.plot([x, tree['x'][parent]], [y, tree['y'][parent]], "-g")
 
         for (ox, oy, size) in self.obstacle_list:
             plt.plot(ox, oy, "ok", ms=30 * size)
@@ -289,6 +372,7 @@ class InformedRRTStar:
 
     @staticmethod
     def plot_ellipse(xCenter, cBest, cMin, etheta):  # pragma: no cover
+        import matplotlib.pyplot as plt
 
         a = math.sqrt(cBest ** 2 - cMin ** 2) / 2.0
         b = cBest / 2.0
@@ -309,6 +393,7 @@ class InformedRRTStar:
 
 
 class Node:
+    __slots__ = ('x', 'y', 'cost', 'parent')
 
     def __init__(self, x, y):
         self.x = x
@@ -316,3 +401,80 @@ class Node:
         self.cost = 0.0
         self.parent = None
 
+
+class NodeTree:
+    """
+    The RRT* tree stored as a struct of arrays, node i is (x[i], y[i]) with cost[i] and parent[i].
+
+    The arrays are preallocated and doubled when full, so adding a node never copies the other nodes' objects.
+    Only the first len(tree) entries are valid. The root has parent NO_PARENT.
+    """
+
+    def __init__(self, capacity=256):
+        self.x = np.empty(capacity)
+        self.y = np.empty(capacity)
+        self.cost = np.empty(capacity)
+        self.parent = np.full(capacity, NO_PARENT, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, x, y, cost=0.0, parent=None):
+        """
+        :param x        : x coordinate of the node
+        :param y        : y coordinate of the node
+        :param cost     : path cost from the root
+        :param parent   : index of the parent node, None for the root
+        :return         : index of the new node
+        """
+        if self.size == len(self.x):
+            self._grow()
+
+        index = self.size
+        self.x[index] = x
+        self.y[index] = y
+        self.cost[index] = cost
+        self.parent[index] = NO_PARENT if parent is None else parent
+        self.size += 1
+
+        return index
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+
+        for name in ('x', 'y', 'cost', 'parent'):
+            old = getattr(self, name)
+            new = np.full(capacity, NO_PARENT, dtype=old.dtype) if name == 'parent' else np.empty(capacity)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def node(self, index):
+        """
+        :param index    : index of a node
+        :return         : a Node holding a copy of that node's data
+        """
+        node = Node(float(self.x[index]), float(self.y[index]))
+        node.cost = float(self.cost[index])
+        parent = int(self.parent[index])
+        node.parent = None if parent == NO_PARENT else parent
+
+        return node
+
+    def nodes(self):
+        """
+        :return : every node in the tree as a list of Node objects
+        """
+        return [self.node(i) for i in range(self.size)]
+
+    def export(self):
+        """
+        :return : a dictionary with copies of the x, y, cost and parent arrays trimmed to the tree size
+        """
+        return {
+            'x': self.x[:self.size].copy(),
+            'y': self.y[:self.size].copy(),
+            'cost': self.cost[:self.size].copy(),
+            'parent': self.parent[:self.size].copy(),
+        }
+
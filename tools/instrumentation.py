@@ -0,0 +1,210 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Nested timing spans and counters for the planning pipeline.
+
+Instrumentation is off by default, then span returns a shared do-nothing context manager and count returns at once,
+so the calls left in the code cost next to nothing. Worker processes keep their own (disabled) state, only the work
+done in the calling process is recorded.
+
+Profile a scenario without editing it, writing the spans and counters as JSON and a cProfile file that pstats or
+snakeviz can read:
+
+    python -m tools.instrumentation --json spans.json --profile run.prof testing_grounds.py
+"""
+import argparse
+import cProfile
+import json
+import runpy
+import sys
+import time
+from collections import defaultdict
+
+enabled = False
+
+_counters = defaultdict(int)
+
+
+class _SpanNode:
+    """
+    Time spent in a span name under one parent span, summed over every time it was entered.
+    """
+    __slots__ = ('name', 'calls', 'total', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.children = {}
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = _SpanNode(name)
+        return node
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'total_time': self.total,
+            'self_time': self.total - sum(child.total for child in self.children.values()),
+            'children': [child.as_dict() for child in self.children.values()],
+        }
+
+
+_root = _SpanNode('root')
+_stack = [_root]
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('node', 'started')
+
+    def __init__(self, name):
+        self.node = _stack[-1].child(name)
+
+    def __enter__(self):
+        _stack.append(self.node)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.node.total += time.perf_counter() - self.started
+        self.node.calls += 1
+        _stack.pop()
+        return False
+
+
+def span(name):
+    """
+    :param name : name of the stage, spans opened inside it are recorded as its children
+    :return     : a context manager timing the block it wraps
+    """
+    if not enabled:
+        return _NULL_SPAN
+
+    return _Span(name)
+
+
+def count(name, amount=1):
+    """
+    :param name     : name of the counter
+    :param amount   : added to the counter
+    """
+    if enabled:
+        _counters[name] += amount
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    # forgets every recorded span and counter
+    global _root
+    _root = _SpanNode('root')
+    _stack[:] = [_root]
+    _counters.clear()
+
+
+def report():
+    """
+    :return : the recorded spans as a tree of {name, calls, total_time, self_time, children} and the counters
+    """
+    return {
+        'spans': [child.as_dict() for child in _root.children.values()],
+        'counters': dict(sorted(_counters.items())),
+    }
+
+
+def export_json(path):
+    """
+    :param path : file the report is written to
+    """
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=2)
+
+
+def format_report(spans=None, depth=0):
+    """
+    :return : the span tree as indented text lines, followed by the counters
+    """
+    if spans is None:
+        data = report()
+        lines = format_report(data['spans'])
+        lines += [f'{name:40} {value}' for name, value in data['counters'].items()]
+        return lines
+
+    lines = []
+    for node in spans:
+        lines.append(f'{"  " * depth + node["name"]:40} {node["total_time"]:10.4f} s  {node["calls"]:8d} calls')
+        lines += format_report(node['children'], depth + 1)
+
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a script or module with spans, counters and cProfile on.')
+    parser.add_argument('--json', help='write the spans and counters to this file')
+    parser.add_argument('--profile', help='write a cProfile (pstats) file')
+    parser.add_argument('-m', dest='module', action='store_true', help='the target is a module name, not a script')
+    parser.add_argument('target', help='script path or module name to run as __main__')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='arguments passed on to the target')
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.target] + args.args
+
+    # run as python -m this file is __main__, the code being profiled records into the imported module
+    from tools import instrumentation
+
+    instrumentation.reset()
+    instrumentation.enable()
+    profiler = cProfile.Profile() if args.profile else None
+
+    try:
+        with instrumentation.span('main'):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                if args.module:
+                    runpy.run_module(args.target, run_name='__main__', alter_sys=True)
+                else:
+                    runpy.run_path(args.target, run_name='__main__')
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        instrumentation.disable()
+
+        if profiler is not None:
+            profiler.dump_stats(args.profile)
+        if args.json:
+            instrumentation.export_json(args.json)
+
+        print('\n'.join(instrumentation.format_report()), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
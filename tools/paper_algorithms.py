@@ -3,34 +3,36 @@ author : Mohammed Guiga
 email  : guiga004@umn.edu
 """
 import math
-import random
+from concurrent.futures import ProcessPoolExecutor
 from tools.environment import Environment
 import tools.guiga_algorithms as gumo
-import matplotlib.pyplot as plt
+import tools.detours as dt
+import tools.coverage as cov
+from tools import instrumentation
+from tools.routes import pack_routes, route_lengths
+import numpy as np
 from tsp_algorithms.tsp_algorithms import exact_tsp
-from tools.draw import Draw
 
 
-def get_random_color(pastel_factor=0.5):
-    return [(x + pastel_factor) / (1.0 + pastel_factor) for x in [random.uniform(0, 1.0) for i in [1, 2, 3]]]
-
-
-def color_distance(c1, c2):
-    return sum([abs(x[0] - x[1]) for x in zip(c1, c2)])
+class MissionPlan:
+    """
+    The result of uav_ugv_trajectory_generation, plain data that can be rendered, stored or sent between processes.
+    """
 
+    def __init__(self, environment, partitions, uav_routes, split, ugv_stops, ugv_tour, total_time, ugv_time,
+                 uav_time, obstacles, specs):
+        self.environment = environment  # Environment of the winning partition size
+        self.partitions = partitions    # partitions as returned by partitioning
+        self.uav_routes = uav_routes    # {uav: route} flown in the partition at the origin
+        self.split = split              # sector split points, or first cells of the coverage stretches
+        self.ugv_stops = ugv_stops      # partition midpoints in partitioning order
+        self.ugv_tour = ugv_tour        # closed UGV tour through the midpoints
+        self.total_time = total_time
+        self.ugv_time = ugv_time
+        self.uav_time = uav_time
+        self.obstacles = obstacles
+        self.specs = specs
 
-def generate_new_color(existing_colors, pastel_factor=0.5):
-    max_distance = None
-    best_color = None
-    for i in range(0, 100):
-        color = get_random_color(pastel_factor=pastel_factor)
-        if not existing_colors:
-            return color
-        best_distance = min([color_distance(color, c) for c in existing_colors])
-        if not max_distance or best_distance > max_distance:
-            max_distance = best_distance
-            best_color = color
-    return best_color
 
 '''
 Taken from:
@@ -84,7 +86,7 @@ ALGORITHM 2 from  S.Seyedi, Y.Yazicioglu, and D.Aksaray.
 '''
 
 
-def partition_feasibility_check(e, ua_max, b_min, environment, n, m=1):
+def partition_feasibility_check(e, ua_max, b_min, environment, n, m=1, table=None, coverage=False):
     """
     :param e            : maximum energy of UAV
     :param ua_max       : maximum speed of UAV
@@ -92,166 +94,523 @@ def partition_feasibility_check(e, ua_max, b_min, environment, n, m=1):
     :param environment  : an instance of an Environment class (small sub partition)
     :param n            : number of UAVs
     :param m            : number of UGVs
+    :param table        : an optional FeasibilityTable, when given the max path is looked up instead of routing the
+                          UAVs and the path data is None
+    :param coverage     : the UAVs fly boustrophedon coverage routes, their length is closed form so the table is
+                          not used and the path data is None, uav_routes generates the routes
     :return             : False if not feasible, path data if feasible
     """
 
-    # this will calculate the maximum path that a uav will travel
-    uav_paths, split = gumo.get_uav_paths(environment=environment, number_of_uavs=n)
-    max_path = gumo.calculate_route_data(uav_paths)
+    if coverage:
+        max_path = cov.max_route_length(environment.width, environment.length, n)
+        route_data = None
+
+    elif table is None:
+        # this will calculate the maximum path that a uav will travel
+        uav_paths, split = gumo.get_uav_paths(environment=environment, number_of_uavs=n)
+        max_path = gumo.calculate_route_data(uav_paths)
+        route_data = (uav_paths, split)
+
+    else:
+        max_path = table.max_path(environment.width, environment.length, n)
+        route_data = None
 
     # determine if the maximum path length is feasible
     if uav_can_cover(max_path, b_min, ua_max, e):
-        return True, max_path, (uav_paths, split)
+        return True, max_path, route_data
     else:
         return False, None
 
 
-def find_feasible_partitions(x_bar, y_bar, specs):
-    # calculate all possible combinations of partition sizes
-    partition_sizes = []
-    feasible = []
+def uav_path_lower_bound(width, length, n):
+    """
+    :param width    : width of the partition
+    :param length   : length of the partition
+    :param n        : number of UAVs
+    :return         : a lower bound on the max UAV path of the partition, found without routing the UAVs
+    """
+    # the cities sit on a unit grid, a uav visiting k of them (besides one on the center point) flies at least half a
+    # cell out to the first, a cell between each of them and half a cell back, k in total, and one of the uavs
+    # visits at least ceil(cities / n)
+    cities = width * length - (width % 2) * (length % 2)
+
+    return math.ceil(cities / n)
+
+
+def check_partition_size(x, y, specs, table=None, coverage=False):
+    """
+    :param x        : width of the partition
+    :param y        : height of the partition
+    :param specs    : hardware specs
+    :param table    : an optional FeasibilityTable used to look up the max UAV path
+    :param coverage : the UAVs fly boustrophedon coverage routes instead of routes through their sectors
+    :return         : [environment, max path, path data] if the partition size is feasible, None otherwise
+    """
+    # no need to route the uavs when even the shortest route they could fly is too long
+    if not uav_can_cover(uav_path_lower_bound(x, y, specs['n']), specs['B-'], specs['uA_max'], specs['e']):
+        instrumentation.count('partition_sizes.bounded')
+        return None
+
+    # create a new environment class based on the partition size
+    environment = Environment(width=x, length=y)
+
+    # check to see if the partition is feasible
+    max_path = partition_feasibility_check(specs['e'], specs['uA_max'], specs['B-'], environment, specs['n'],
+                                           table=table, coverage=coverage)
+
+    if max_path[0]:
+        return [environment, max_path[1], max_path[2]]
+
+    return None
+
+
+def _check_partition_size(args):
+    # unpacks the arguments sent to a worker process
+    return check_partition_size(*args)
+
+
+def uav_routes(environment, n, coverage=False):
+    """
+    :param environment  : an instance of the Environment class (small sub partition)
+    :param n            : number of UAVs
+    :param coverage     : the UAVs fly boustrophedon coverage routes instead of routes through their sectors
+    :return             : a dictionary containing all of the routes, and the splitting points of the environment
+    """
+    if coverage:
+        return cov.coverage_routes(environment, n)
+
+    return gumo.get_uav_paths(environment=environment, number_of_uavs=n)
+
+
+def _last_feasible(first, last, feasible):
+    """
+    :param first    : smallest x to look at
+    :param last     : largest x to look at
+    :param feasible : a function of x, True while x is small enough
+    :return         : the largest x in [first, last] that is feasible, first - 1 if there is none
+    """
+    if last < first or not feasible(first):
+        return first - 1
+
+    # binary search for the boundary, first is always feasible and everything past last is not
+    while first < last:
+        middle = (first + last + 1) // 2
+
+        if feasible(middle):
+            first = middle
+        else:
+            last = middle - 1
+
+    return first
+
+
+def _candidate_rows(x_bar, y_bar, specs, max_cells=None):
+    """
+    :param x_bar        : width of the environment
+    :param y_bar        : height of the environment
+    :param specs        : hardware specs
+    :param max_cells    : skip partition sizes with more cells than this, None keeps every size
+    :return             : yields (y, first, last) for every row, the sizes x = first .. last of the row being the only
+                          ones whose UAV path lower bound is still feasible
+    """
+    def bound_feasible(x, y):
+        return uav_can_cover(uav_path_lower_bound(x, y, specs['n']), specs['B-'], specs['uA_max'], specs['e'])
+
+    # the lower bound grows with both sides (the measured max path does not, it depends on the parity of the sides
+    # and on the tsp solver), so every row ends at or before the row above it
+    limit = x_bar
 
     for y in range(1, y_bar + 1):
+        # a single cell is never a partition size
+        first = 2 if y == 1 else 1
+        last = limit if max_cells is None else min(limit, max_cells // y)
 
-        for x in range(1, x_bar + 1):
+        last = _last_feasible(first, last, lambda x: bound_feasible(x, y))
 
-            if x * y >= 100 or x * y == 1:
+        if last < first:
+            if y == 1:
+                # 1x1 was never a candidate, the next row may still hold 1 wide partitions
+                limit = 1
                 continue
 
-            # create a new environment class based on the partition size
-            environment = Environment(width=x, length=y)
+            # 1 wide is out of reach here, so it is in every taller row as well
+            break
+
+        limit = last
+
+        yield y, first, last
+
+
+def find_feasible_partitions(x_bar, y_bar, specs, table=None, workers=None, chunksize=None, max_cells=None,
+                             prune=False, coverage=False):
+    """
+    :param x_bar        : width of the environment
+    :param y_bar        : height of the environment
+    :param specs        : hardware specs
+    :param table        : an optional FeasibilityTable used to look up the max UAV path of each partition size
+    :param workers      : number of worker processes checking partition sizes, None or 1 checks them serially
+    :param chunksize    : number of partition sizes sent to a worker at a time, picked automatically if None
+    :param max_cells    : skip partition sizes with more cells than this, None checks every size
+    :param prune        : only check the sizes whose UAV path lower bound is feasible, found by a binary search per
+                          row, the result is the same
+    :param coverage     : the UAVs fly boustrophedon coverage routes, which makes every check a closed form
+    :return             : a list of [environment, max path, path data] for every feasible partition size,
+                          ordered the same way whether the check runs serially or in parallel
+    """
+    # calculate all possible combinations of partition sizes
+    partition_sizes = []
+
+    if prune:
+        for y, first, last in _candidate_rows(x_bar, y_bar, specs, max_cells):
+            partition_sizes += [(x, y, specs, table, coverage) for x in range(first, last + 1)]
+
+    else:
+        for y in range(1, y_bar + 1):
 
-            # check to see if the partition is feasible
-            max_path = partition_feasibility_check(specs['e'], specs['uA_max'], specs['B-'], environment, specs['n'])
+            for x in range(1, x_bar + 1):
 
-            if max_path[0]:
-                feasible.append([environment, max_path[1], max_path[2]])
+                if x * y == 1 or (max_cells is not None and x * y > max_cells):
+                    continue
 
-    return feasible
+                partition_sizes.append((x, y, specs, table, coverage))
 
+    instrumentation.count('partition_sizes.checked', len(partition_sizes))
 
-def find_min_partitions(x_bar, y_bar, specs, obstacles):
-    feasible = find_feasible_partitions(x_bar, y_bar, specs)
+    if workers is None or workers <= 1 or len(partition_sizes) <= 1:
+        results = map(_check_partition_size, partition_sizes)
 
-    # these will get updated iteratively
-    min_env = None
-    min_partitions = None
-    min_drones = None
+    else:
+        if chunksize is None:
+            # a few chunks per worker keeps the load balanced, larger partitions take longer to route
+            chunksize = max(1, math.ceil(len(partition_sizes) / (4 * workers)))
+
+        # map returns the results in submission order, so the ordering matches the serial check
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_check_partition_size, partition_sizes, chunksize=chunksize))
+
+    return [result for result in results if result is not None]
+
+
+def partition_midpoints(partitions):
+    """
+    :param partitions   : a list of partitions as returned by partitioning
+    :return             : an (P, 2) array with the midpoint of every partition
+    """
+    # each partition holds [[x0, x1], [y0, y1], ...], the plotting values are dropped
+    bounds = np.array([[part[0][0], part[0][1], part[1][0], part[1][1]] for part in partitions], dtype=float)
+
+    return np.column_stack(((bounds[:, 0] + bounds[:, 1]) / 2, (bounds[:, 2] + bounds[:, 3]) / 2))
+
+
+def _touches_obstacle(part, circles):
+    # True if any circle reaches into the partition's rectangle
+    (x0, x1), (y0, y1) = part[0], part[1]
+
+    for x, y, radius in circles:
+        dx = x - min(max(x, x0), x1)
+        dy = y - min(max(y, y0), y1)
+
+        if dx * dx + dy * dy <= radius * radius:
+            return True
+
+    return False
+
+
+def detour_partitions(feasible, candidates, midpoints, specs, obstacles, cache=None, workers=None, coverage=False,
+                      executor=None):
+    """
+    :param feasible     : feasible partition sizes as returned by find_feasible_partitions
+    :param candidates   : the partitions of every feasible size, as returned by partitioning
+    :param midpoints    : the partition midpoints of every feasible size, the UGV drives through them in order
+    :param specs        : hardware specs
+    :param obstacles    : obstacles as listed in environment_voxels['obstacle']
+    :param cache        : an optional DetourCache shared between calls
+    :param workers      : number of worker processes planning detours, None or 1 plans them serially
+    :param coverage     : the UAVs fly boustrophedon coverage routes instead of routes through their sectors
+    :param executor     : an optional executor from tools.detours.detour_executor shared by the whole search
+    :return             : the max UAV path of every feasible size once its routes go around the obstacles (None if
+                          the size is no longer feasible, or a UAV or UGV route crosses an obstacle no detour was
+                          found around), and the length of every UGV route around the obstacles
+    """
+    circles = dt.obstacle_circles(obstacles)
+
+    # only partitions an obstacle reaches into can have routes crossing it, their UAV routes are moved from the
+    # partition at the origin to where the partition sits in the environment
+    placed = []
+
+    for partition, partitions in zip(feasible, candidates):
+        near = [part for part in partitions if _touches_obstacle(part, circles)]
+        routes = []
+
+        if near:
+            # partition sizes looked up in a feasibility table (or covered) carry no routes
+            uav_paths = partition[2][0] if partition[2] is not None else \
+                uav_routes(partition[0], specs['n'], coverage=coverage)[0]
+
+            for part in near:
+                for route in uav_paths.values():
+                    # cities inside an obstacle are left out, the UAVs cannot fly to them
+                    route = [[x + part[0][0], y + part[1][0]] for x, y in route]
+                    routes.append(dt.drop_blocked_points(route, circles))
+
+        placed.append(routes)
+
+    ugv_routes = [points.tolist() for points in midpoints]
+
+    # every crossing segment of every candidate is planned in one batch, recurring segments only once
+    cache = dt.plan_detours([route for routes in placed for route in routes] + ugv_routes, circles, cache=cache,
+                            workers=workers, executor=executor)
+
+    max_paths = []
+    ugv_lengths = []
+
+    for partition, routes, ugv_route in zip(feasible, placed, ugv_routes):
+        max_path = partition[1]
+
+        patched = [dt.patch_route(route, circles, cache) for route in routes]
+        ugv_patched = dt.patch_route(ugv_route, circles, cache)
+
+        # a route still crossing an obstacle, for lack of a detour, rules the partition size out
+        if any(route is None for route in patched) or ugv_patched is None:
+            instrumentation.count('partition_sizes.blocked')
+            max_paths.append(None)
+            ugv_lengths.append(math.inf)
+            continue
+
+        if patched:
+            max_path = max(max_path, route_lengths(*pack_routes(patched))[1])
+
+        if not uav_can_cover(max_path, specs['B-'], specs['uA_max'], specs['e']):
+            max_path = None
+
+        max_paths.append(max_path)
+        ugv_lengths.append(gumo.get_path_length(ugv_patched))
+
+    return max_paths, ugv_lengths
+
+
+def _report_partition(a1, a2, ugv_time, uav_time, uav_ugv_time):
+    print(f'\npartition size   : {a1}x{a2}')
+    print(f'ugv time         : {ugv_time}')
+    print(f'uav time         : {uav_time}')
+    print(f'total time       : {uav_ugv_time}\n')
+
+
+def pruned_min_partition(x_bar, y_bar, specs, obstacles, table=None, workers=None, detour_cache=None,
+                         coverage=False, executor=None):
+    """
+    :param x_bar        : width of the environment
+    :param y_bar        : height of the environment
+    :param specs        : hardware specs
+    :param obstacles    : obstacles as listed in environment_voxels['obstacle']
+    :param table        : an optional FeasibilityTable used to look up the max UAV path of each partition size
+    :param workers      : number of worker processes planning detours, None or 1 plans them serially
+    :param detour_cache : an optional DetourCache shared between calls
+    :param coverage     : the UAVs fly boustrophedon coverage routes instead of routes through their sectors
+    :param executor     : an optional executor from tools.detours.detour_executor, one is started for the search
+                          if workers asks for more than one process
+    :return             : [partition, partitions, midpoints, ugv time, uav time, total time] of the fastest feasible
+                          partition size, None if there is none
+    """
+    # the sizes are routed one at a time, so a single pool serves every size instead of one per size
+    own_executor = executor is None and obstacles and workers is not None and workers > 1
+
+    if own_executor:
+        executor = dt.detour_executor(workers)
+
+    try:
+        return _pruned_min_partition(x_bar, y_bar, specs, obstacles, table, workers, detour_cache, coverage,
+                                     executor)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def _pruned_min_partition(x_bar, y_bar, specs, obstacles, table, workers, detour_cache, coverage, executor):
+    # the sizes are visited in the same order as the full search so a tie goes to the same size
+    winner = None
     min_time = math.inf
 
-    # iterate through the feasible partitions and find the one with the least time
-    for partition in feasible:
+    for y, first, last in _candidate_rows(x_bar, y_bar, specs):
+        for x in range(first, last + 1):
+            partitions = partitioning(x, y, x_bar, y_bar)
+            points = partition_midpoints(partitions)
 
-        a1 = partition[0].width
-        a2 = partition[0].length
+            # the straight UGV route is exact without obstacles and detours only make the routes longer, so a size
+            # whose bound is no better than the best time so far can be skipped before routing its UAVs
+            ugv_time = gumo.get_path_length(points) / specs['uG_max']
+            bound = ugv_time + (uav_path_lower_bound(x, y, specs['n']) / specs['uA_max']) * len(partitions)
 
-        partitions = partitioning(a1, a2, x_bar, y_bar)
-        partition_midpoints = []
+            if bound >= min_time:
+                instrumentation.count('partition_sizes.pruned')
+                continue
 
-        # calculate all of the midpoints of the partitions
-        for part in partitions:
-            bottom_corner = (part[0][0], part[1][0])
-            width_x = part[0][1] - part[0][0]
-            height_y = part[1][1] - part[1][0]
-            point = [bottom_corner[0] + width_x / 2, bottom_corner[1] + height_y / 2]
+            instrumentation.count('partition_sizes.checked')
+            partition = check_partition_size(x, y, specs, table=table, coverage=coverage)
 
-            partition_midpoints.append(point)
+            if partition is None:
+                continue
 
-        # run TSP on every UGV path possibility
-        ugv_path = exact_tsp(partition_midpoints)
-        ugv_path.append(ugv_path[0])
-        ugv_length = gumo.get_path_length(ugv_path)
+            max_path = partition[1]
 
-        ugv_length = gumo.get_path_length(partition_midpoints)
+            if obstacles:
+                max_paths, ugv_lengths = detour_partitions([partition], [partitions], [points], specs, obstacles,
+                                                           cache=detour_cache, workers=workers, coverage=coverage,
+                                                           executor=executor)
 
-        ugv_time = ugv_length / specs['uG_max']
-        uav_time = (partition[1] / specs['uA_max']) * len(partitions)
-        uav_ugv_time = ugv_time + uav_time
+                if max_paths[0] is None:
+                    continue
 
-        print(f'\npartition size   : {a1}x{a2}')
-        print(f'ugv time         : {ugv_time}')
-        print(f'uav time         : {uav_time}')
-        print(f'total time       : {uav_ugv_time}\n')
+                max_path = max_paths[0]
+                ugv_time = ugv_lengths[0] / specs['uG_max']
 
-        if uav_ugv_time < min_time:
-            min_env = partition[0]
-            min_drones = partition[2]
-            min_partitions = partitions
-            min_ugv = partition_midpoints
-            min_midpoints = ugv_path
-            min_time = uav_ugv_time
+            uav_time = (max_path / specs['uA_max']) * len(partitions)
+            uav_ugv_time = ugv_time + uav_time
 
-    print('*** WINNER ****')
-    print(f"number of UAVs   : {specs['n']}")
-    print(f'partition size   : {min_env.width}x{min_env.length}')
-    print(f'total time       : {min_time}')
+            _report_partition(x, y, ugv_time, uav_time, uav_ugv_time)
 
-    return min_env, min_drones, min_partitions, min_ugv, min_midpoints, min_time
+            if uav_ugv_time < min_time:
+                winner = [partition, partitions, points, ugv_time, uav_time, uav_ugv_time]
+                min_time = uav_ugv_time
 
+    return winner
 
-'''
-Adapted from:
-ALGORITHM 3 from  S.Seyedi, Y.Yazicioglu, and D.Aksaray.    
-Persistent surveillance with energy-constrained uavs and mobile charging stations.
-arXiv preprint arXiv:1908.05727,2019.
-'''
 
+def find_min_partitions(x_bar, y_bar, specs, obstacles, table=None, workers=None, detour_cache=None, prune=False,
+                        coverage=False):
+    if obstacles and detour_cache is None:
+        detour_cache = dt.DetourCache()
 
-def uav_ugv_trajectory_generation(x_bar, y_bar, specs=None, obstacles=[]):
+    if prune:
+        # skips the partition sizes that cannot beat the best one found so far
+        with instrumentation.span('pruned_search'):
+            winner = pruned_min_partition(x_bar, y_bar, specs, obstacles, table=table, workers=workers,
+                                          detour_cache=detour_cache, coverage=coverage)
 
-    minima = find_min_partitions(x_bar, y_bar, specs, obstacles)
-    min_drones = minima[1]
-    min_partitions = minima[2]
-    min_midpoints = minima[4]
+    else:
+        with instrumentation.span('partition_sweep'):
+            feasible = find_feasible_partitions(x_bar, y_bar, specs, table=table, workers=workers, coverage=coverage)
+
+        instrumentation.count('partition_sizes.feasible', len(feasible))
 
-    picasso = Draw()
-    picasso.title = "2D Top View"
+        # calculate all of the partitions and their midpoints
+        with instrumentation.span('partitioning'):
+            candidates = [partitioning(partition[0].width, partition[0].length, x_bar, y_bar)
+                          for partition in feasible]
+            midpoints = [partition_midpoints(partitions) for partitions in candidates]
 
-    colors = []
-    for _ in range(len(min_partitions)):
-        colors.append(generate_new_color(colors, pastel_factor=0.9))
+        if obstacles:
+            # routes crossing an obstacle go around it, which lengthens them and may make a partition size infeasible
+            with instrumentation.span('detours'):
+                max_paths, ugv_lengths = detour_partitions(feasible, candidates, midpoints, specs, obstacles,
+                                                           cache=detour_cache, workers=workers, coverage=coverage)
 
-    first_color = colors[0]
+        else:
+            max_paths = [partition[1] for partition in feasible]
 
-    for partition in min_partitions:
-        edge_color = 'black'
-        order = partition[2]
-        opacity = partition[3]
-        line_width = 3
+            # the UGV drives through the midpoints, measure the route of every candidate in one pass
+            ugv_lengths = route_lengths(*pack_routes(midpoints))[0].tolist()
 
-        bottom_corner = (partition[0][0], partition[1][0])
-        width_x = partition[0][1] - partition[0][0]
-        height_y = partition[1][1] - partition[1][0]
+        # this will get updated iteratively
+        winner = None
+        min_time = math.inf
 
-        rectangle = plt.Rectangle \
-                (
-                xy=bottom_corner,
-                width=width_x,
-                height=height_y,
-                fill=True,
-                color=colors.pop(),
-                ec=edge_color,
-                lw=line_width,
-                zorder=order,
-                alpha=opacity,
-            )
-        picasso.draw.add_patch(rectangle)
+        # iterate through the feasible partitions and find the one with the least time
+        for partition, partitions, max_path, ugv_length, points in zip(feasible, candidates, max_paths, ugv_lengths,
+                                                                       midpoints):
+
+            if max_path is None:
+                continue
 
-    picasso.draw_path(min_midpoints, 'white', width=0.15)
+            ugv_time = ugv_length / specs['uG_max']
+            uav_time = (max_path / specs['uA_max']) * len(partitions)
+            uav_ugv_time = ugv_time + uav_time
 
-    uav_colors = [first_color]
+            _report_partition(partition[0].width, partition[0].length, ugv_time, uav_time, uav_ugv_time)
 
-    for _ in range(len(min_drones[0]) + 1):
-        uav_colors.append(generate_new_color(colors, pastel_factor=0.3))
+            if uav_ugv_time < min_time:
+                winner = [partition, partitions, points, ugv_time, uav_time, uav_ugv_time]
+                min_time = uav_ugv_time
 
-    for i, key in enumerate(min_drones[0]):
-        path = min_drones[0][key]
-        picasso.draw_path(path=path, color=uav_colors[i + 1])
+    if winner is None:
+        # not even the smallest partition fits the uav's energy (or every size is blocked by the obstacles)
+        raise ValueError(f"no feasible partition size for a {x_bar}x{y_bar} environment with a UAV energy of "
+                         f"{specs['e']}")
 
-    if obstacles:
+    partition, min_partitions, points, min_ugv_time, min_uav_time, min_time = winner
+    min_env = partition[0]
+    min_drones = partition[2]
+    min_ugv = points.tolist()
 
-        for obstacle in obstacles:
-            circle = plt.Circle(obstacle[0], obstacle[1], facecolor='black', zorder=99)
-            picasso.draw.add_patch(circle)
+    # run TSP on the winning UGV path
+    with instrumentation.span('ugv_tour'):
+        min_midpoints = exact_tsp(min_ugv)
+        min_midpoints.append(min_midpoints[0])
+
+    with instrumentation.span('winner_routes'):
+        # partition sizes looked up in a feasibility table (or covered) carry no routes, only the winner's are needed
+        if min_drones is None:
+            min_drones = uav_routes(min_env, specs['n'], coverage=coverage)
+
+        if obstacles:
+            # the drawn routes are those of the partition at the origin, and the UGV tour between partitions
+            routes = {key: dt.drop_blocked_points(route, obstacles) for key, route in min_drones[0].items()}
+            dt.plan_detours(list(routes.values()) + [min_midpoints], obstacles, cache=detour_cache, workers=workers)
+
+            patched = {key: dt.patch_route(route, obstacles, detour_cache) for key, route in routes.items()}
+            tour = dt.patch_route(min_midpoints, obstacles, detour_cache)
+
+            if tour is None:
+                # the tsp tour crosses an obstacle without a detour, fall back to the order the winner was scored with
+                tour = min_ugv + min_ugv[:1]
+                dt.plan_detours([tour], obstacles, cache=detour_cache, workers=workers)
+                tour = dt.patch_route(tour, obstacles, detour_cache)
+
+            # the routes at the origin were already patched while scoring, only a tour can be left without a detour
+            if tour is None or None in patched.values():
+                raise ValueError(f'no detour around the obstacles for the routes of partition size '
+                                 f'{min_env.width}x{min_env.length}')
+
+            min_drones = (patched, min_drones[1])
+            min_midpoints = tour
+
+    print('*** WINNER ****')
+    print(f"number of UAVs   : {specs['n']}")
+    print(f'partition size   : {min_env.width}x{min_env.length}')
+    print(f'total time       : {min_time}')
+
+    return min_env, min_drones, min_partitions, min_ugv, min_midpoints, min_time, min_ugv_time, min_uav_time
+
+
+'''
+Adapted from:
+ALGORITHM 3 from  S.Seyedi, Y.Yazicioglu, and D.Aksaray.    
+Persistent surveillance with energy-constrained uavs and mobile charging stations.
+arXiv preprint arXiv:1908.05727,2019.
+'''
+
+
+def uav_ugv_trajectory_generation(x_bar, y_bar, specs=None, obstacles=[], table=None, workers=None, detour_cache=None,
+                                  prune=False, coverage=False):
+    """
+    :param x_bar        : width of the environment
+    :param y_bar        : height of the environment
+    :param specs        : hardware specs
+    :param obstacles    : obstacles as listed in environment_voxels['obstacle']
+    :param table        : an optional FeasibilityTable used to look up the max UAV path of each partition size
+    :param workers      : number of worker processes, None or 1 runs everything in this process
+    :param detour_cache : an optional DetourCache shared between calls
+    :param prune        : search the partition sizes with pruned_min_partition, which skips the sizes that cannot
+                          beat the best one so far without routing their UAVs, the winner is the same
+    :param coverage     : the UAVs fly boustrophedon coverage routes (tools.coverage) instead of tsp routes through
+                          their sectors, which keeps large partitions cheap to check
+    :return             : a MissionPlan, tools.draw.render_mission_plan draws it, raises a ValueError if no
+                          partition size is feasible
+    """
+    with instrumentation.span('find_min_partitions'):
+        minima = find_min_partitions(x_bar, y_bar, specs, obstacles, table=table, workers=workers,
+                                     detour_cache=detour_cache, prune=prune, coverage=coverage)
 
-    return picasso
+    return MissionPlan(environment=minima[0], partitions=minima[2], uav_routes=minima[1][0], split=minima[1][1],
+                       ugv_stops=minima[3], ugv_tour=minima[4], total_time=minima[5], ugv_time=minima[6],
+                       uav_time=minima[7], obstacles=obstacles, specs=specs)
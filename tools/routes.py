@@ -0,0 +1,61 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+"""
+import numpy as np
+
+
+def pack_routes(routes):
+    """
+    :param routes   : a list of routes, each a list of points
+    :return         : an (M, 2) array with the points of every route back to back, and an array of R + 1 offsets
+                      where route r is coords[offsets[r]:offsets[r + 1]]
+    """
+    sizes = [len(route) for route in routes]
+    offsets = np.zeros(len(routes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+
+    if offsets[-1] == 0:
+        return np.empty((0, 2)), offsets
+
+    coords = np.concatenate([np.asarray(route, dtype=float).reshape(-1, 2) for route in routes if len(route)])
+
+    return coords, offsets
+
+
+def route_lengths(coords, offsets):
+    """
+    :param coords   : an (M, 2) array with the points of every route back to back
+    :param offsets  : an array of R + 1 offsets, route r is coords[offsets[r]:offsets[r + 1]]
+    :return         : an array with the length of every route, and the longest length (0 if there are no routes)
+    """
+    coords = np.asarray(coords, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    if len(offsets) < 2:
+        return np.zeros(0), 0.0
+
+    # cumulative distance along all of the points, segments between two routes are never read
+    steps = np.hypot(*np.diff(coords, axis=0).T) if len(coords) > 1 else np.zeros(0)
+    travelled = np.concatenate(([0.0], np.cumsum(steps)))
+
+    starts = offsets[:-1]
+    ends = np.maximum(offsets[1:] - 1, starts)
+
+    if len(travelled) == 1:
+        lengths = np.zeros(len(starts))
+    else:
+        lengths = travelled[np.minimum(ends, len(travelled) - 1)] - travelled[np.minimum(starts, len(travelled) - 1)]
+
+    return lengths, float(lengths.max())
+
+
+def path_length(path):
+    """
+    :param path : a list of points
+    :return     : the path length
+    """
+    if len(path) < 2:
+        return 0.0
+
+    return float(np.hypot(*np.diff(np.asarray(path, dtype=float), axis=0).T).sum())
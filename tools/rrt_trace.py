@@ -0,0 +1,180 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Compact binary event traces of an InformedRRTStar search, and an offline replay of them.
+
+A trace file starts with MAGIC, a little-endian uint32 holding the length of a JSON header (start, goal,
+obstacles, sampling area), the header itself, and then fixed-size EVENT_DTYPE records.
+"""
+import json
+import math
+import struct
+import numpy as np
+
+MAGIC = b'RRTTRACE1'
+
+# event kinds
+SAMPLE = 0      # x, y of the random sample
+NODE = 1        # index, parent, x, y and cost of a node added to the tree
+REWIRE = 2      # index, new parent and new cost of a rewired node
+CBEST = 3       # new best path length in value
+
+EVENT_DTYPE = np.dtype([
+    ('iteration', '<u4'),
+    ('kind', 'u1'),
+    ('index', '<i4'),
+    ('parent', '<i4'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('value', '<f8'),
+])
+
+
+class TraceWriter:
+    """
+    Buffers search events in memory and appends them to the trace file in blocks.
+    """
+
+    def __init__(self, path, header, buffer_size=4096):
+        """
+        :param path         : location of the trace file, overwritten if it exists
+        :param header       : a JSON serialisable dictionary describing the search
+        :param buffer_size  : number of events held before they are written out
+        """
+        self.path = path
+        self.buffer = np.zeros(buffer_size, dtype=EVENT_DTYPE)
+        self.count = 0
+
+        header = json.dumps(header).encode()
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(struct.pack('<I', len(header)))
+        self.file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record(self, iteration, kind, index=-1, parent=-1, x=math.nan, y=math.nan, value=math.nan):
+        if self.count == len(self.buffer):
+            self.flush()
+
+        self.buffer[self.count] = (iteration, kind, index, parent, x, y, value)
+        self.count += 1
+
+    def sample(self, iteration, x, y):
+        self._record(iteration, SAMPLE, x=x, y=y)
+
+    def node(self, iteration, index, parent, x, y, cost):
+        self._record(iteration, NODE, index=index, parent=parent, x=x, y=y, value=cost)
+
+    def rewire(self, iteration, indices, parent, costs):
+        for index, cost in zip(np.atleast_1d(indices).tolist(), np.atleast_1d(costs).tolist()):
+            self._record(iteration, REWIRE, index=index, parent=parent, value=cost)
+
+    def cbest(self, iteration, value):
+        self._record(iteration, CBEST, value=value)
+
+    def flush(self):
+        self.buffer[:self.count].tofile(self.file)
+        self.count = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def load_trace(path):
+    """
+    :param path : location of a trace file
+    :return     : the header dictionary and a structured array of every event
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an RRT trace file')
+
+        size, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(size).decode())
+        events = np.fromfile(file, dtype=EVENT_DTYPE)
+
+    return header, events
+
+
+def replay_trace(path, step=1, interval=10, output=None):
+    """
+    :param path     : location of a trace file
+    :param step     : number of search iterations drawn per animation frame
+    :param interval : delay between frames in milliseconds
+    :param output   : optional video or gif file to save the animation to instead of showing it
+    :return         : the matplotlib animation
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+    from tools.informed_rrt_star import InformedRRTStar
+
+    header, events = load_trace(path)
+    start, goal = header['start'], header['goal']
+    # older traces store a square sampling area as [min, max]
+    rand_area = header['randArea'] if len(header['randArea']) == 4 else header['randArea'] * 2
+
+    c_min = math.hypot(goal[0] - start[0], goal[1] - start[1])
+    x_center = np.array([[(start[0] + goal[0]) / 2.0], [(start[1] + goal[1]) / 2.0], [0]])
+    e_theta = math.atan2(goal[1] - start[1], goal[0] - start[0])
+
+    iterations = int(events['iteration'].max()) + 1 if len(events) else 0
+    frame_ends = np.searchsorted(events['iteration'], np.arange(step, iterations + step, step))
+
+    # tree state rebuilt as the events are played back, node 0 is the start
+    xs = {0: start[0]}
+    ys = {0: start[1]}
+    parents = {}
+    state = {'position': 0, 'cBest': math.inf, 'sample': None}
+
+    figure = plt.figure()
+
+    def draw(frame):
+        for event in events[state['position']:frame_ends[frame]]:
+            kind = event['kind']
+            if kind == SAMPLE:
+                state['sample'] = (event['x'], event['y'])
+            elif kind == NODE:
+                xs[int(event['index'])] = event['x']
+                ys[int(event['index'])] = event['y']
+                parents[int(event['index'])] = int(event['parent'])
+            elif kind == REWIRE:
+                parents[int(event['index'])] = int(event['parent'])
+            elif kind == CBEST:
+                state['cBest'] = event['value']
+        state['position'] = frame_ends[frame]
+
+        plt.clf()
+        if state['sample'] is not None:
+            plt.plot(state['sample'][0], state['sample'][1], "^k")
+        if state['cBest'] != math.inf:
+            InformedRRTStar.plot_ellipse(x_center, state['cBest'], c_min, e_theta)
+
+        for index, parent in parents.items():
+            plt.plot([xs[index], xs[parent]], [ys[index], ys[parent]], "-g")
+
+        for (ox, oy, size) in header['obstacles']:
+            plt.plot(ox, oy, "ok", ms=30 * size)
+
+        plt.plot(start[0], start[1], "xr")
+        plt.plot(goal[0], goal[1], "xr")
+        plt.axis(rand_area)
+        plt.grid(True)
+
+    animation = FuncAnimation(figure, draw, frames=len(frame_ends), interval=interval, repeat=False)
+
+    if output is not None:
+        animation.save(output)
+        plt.close(figure)
+    else:
+        plt.show()
+
+    return animation
@@ -0,0 +1,141 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+"""
+import math
+
+
+class GridIndex:
+    """
+    A uniform grid hash over 2D points that answers nearest point and radius queries.
+
+    Points are bucketed by the grid cell they fall in, so a query only looks at the cells around it instead of
+    every point. Points can be added at any time, which suits a tree that grows one node per iteration.
+    """
+
+    def __init__(self, cell_size):
+        """
+        :param cell_size : side length of a grid cell, roughly the typical query distance works well
+        """
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.xs = []
+        self.ys = []
+
+        # bounds of the occupied cells, queries never look past them
+        self.min_cx = self.min_cy = math.inf
+        self.max_cx = self.max_cy = -math.inf
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, x, y):
+        """
+        :param x : x coordinate of the point
+        :param y : y coordinate of the point
+        :return  : the index given to the point, points are numbered in the order they are inserted
+        """
+        index = len(self.xs)
+        self.xs.append(x)
+        self.ys.append(y)
+
+        cx, cy = self._cell(x, y)
+        self.cells.setdefault((cx, cy), []).append(index)
+
+        self.min_cx = min(self.min_cx, cx)
+        self.max_cx = max(self.max_cx, cx)
+        self.min_cy = min(self.min_cy, cy)
+        self.max_cy = max(self.max_cy, cy)
+
+        return index
+
+    def _ring(self, cx, cy, r):
+        # occupied-bounds cells whose chebyshev distance from (cx, cy) is exactly r
+        if r == 0:
+            yield cx, cy
+            return
+
+        x_lo, x_hi = max(cx - r, self.min_cx), min(cx + r, self.max_cx)
+        y_lo, y_hi = max(cy - r + 1, self.min_cy), min(cy + r - 1, self.max_cy)
+
+        for y in (cy - r, cy + r):
+            if self.min_cy <= y <= self.max_cy:
+                for x in range(x_lo, x_hi + 1):
+                    yield x, y
+
+        for x in (cx - r, cx + r):
+            if self.min_cx <= x <= self.max_cx:
+                for y in range(y_lo, y_hi + 1):
+                    yield x, y
+
+    def nearest(self, x, y):
+        """
+        :param x : x coordinate of the query
+        :param y : y coordinate of the query
+        :return  : index of the closest point, the lowest index wins a tie, None if the index is empty
+        """
+        if not self.xs:
+            return None
+
+        cx, cy = self._cell(x, y)
+
+        # rings closer than the occupied bounds hold nothing, start at the first one that reaches them
+        first = max(self.min_cx - cx, cx - self.max_cx, self.min_cy - cy, cy - self.max_cy, 0)
+        last = max(abs(cx - self.min_cx), abs(cx - self.max_cx), abs(cy - self.min_cy), abs(cy - self.max_cy))
+
+        best = None
+        best_d = math.inf
+
+        for r in range(first, last + 1):
+            for cell in self._ring(cx, cy, r):
+                for i in self.cells.get(cell, ()):
+                    d = (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2
+                    if d < best_d or (d == best_d and i < best):
+                        best = i
+                        best_d = d
+
+            # every point in ring r + 1 or beyond is at least r cells away
+            if best is not None and best_d < (r * self.cell_size) ** 2:
+                break
+
+        return best
+
+    def within(self, x, y, radius):
+        """
+        :param x        : x coordinate of the query
+        :param y        : y coordinate of the query
+        :param radius   : search radius
+        :return         : sorted indices of every point no further than radius from the query
+        """
+        if not self.xs:
+            return []
+
+        r2 = radius ** 2
+        cx_lo, cy_lo = self._cell(x - radius, y - radius)
+        cx_hi, cy_hi = self._cell(x + radius, y + radius)
+
+        cx_lo, cx_hi = max(cx_lo, self.min_cx), min(cx_hi, self.max_cx)
+        cy_lo, cy_hi = max(cy_lo, self.min_cy), min(cy_hi, self.max_cy)
+
+        found = []
+
+        if cx_lo > cx_hi or cy_lo > cy_hi:
+            return found
+
+        if (cx_hi - cx_lo + 1) * (cy_hi - cy_lo + 1) > len(self.cells):
+            # the search box covers more cells than are occupied, walk the occupied ones instead
+            cells = [cell for cell in self.cells if cx_lo <= cell[0] <= cx_hi and cy_lo <= cell[1] <= cy_hi]
+        else:
+            cells = [(cx, cy) for cx in range(cx_lo, cx_hi + 1) for cy in range(cy_lo, cy_hi + 1)]
+
+        for cell in cells:
+            for i in self.cells.get(cell, ()):
+                if (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2 <= r2:
+                    found.append(i)
+
+        found.sort()
+
+        return found
@@ -1,96 +1,188 @@
-import math
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tsp_algorithms.distance_matrix import DistanceMatrix
 
 
-def euc_2d(c1, c2):
-    return round(math.sqrt((c1[0] - c2[0])**2.0 + (c1[1] - c2[1])**2.0))
+def cost(permutation, distances):
+    return distances.tour_length(permutation)
 
-def cost(permutation, cities):
-    distance = 0
-    for i in range(len(permutation)):
-        c2 = permutation[0] if (i == (len(permutation)-1)) else permutation[i+1]
-        distance += euc_2d(cities[permutation[i]], cities[c2])
-    return distance
-
-def random_permutation(cities):
+# rng is a random.Random, or the random module itself when the caller's global stream should be used
+def random_permutation(cities, rng=random):
     perm = list(range(len(cities)))
     for i in range(len(perm)):
-        r = random.randint(0, len(perm)-(i+1)) + i
+        r = rng.randint(0, len(perm)-(i+1)) + i
         perm[r], perm[i] = perm[i], perm[r]
     return perm
 
+def heuristic_matrix(distances, c_heur):
+    d = distances.square()
+    # coincident cities have no length between them, give them the largest finite heuristic instead
+    positive = d[d > 0]
+    floor = positive.min() if len(positive) else 1.0
+    return (1.0 / np.maximum(d, floor)) ** c_heur
+
 def initialise_pheromone_matrix(num_cities, init_pher):
-    return [[init_pher]*num_cities]*num_cities
-
-def calculate_choices(cities, last_city, exclude, pheromone, c_heur, c_hist):
-    choices = []
-    for i in range(len(cities)):
-        if i not in exclude:
-            prob = {'city':i}
-            prob['history'] = pheromone[last_city][i] ** c_hist
-            prob['distance'] = euc_2d(cities[last_city], cities[i])
-            prob['heuristic'] = (1.0/prob['distance']) ** c_heur
-            prob['prob'] = prob['history'] * prob['heuristic']
-            choices.append(prob)
-    return choices
-
-def prob_select(choices):
-    total = sum(element['prob'] for element in choices)
-    if total == 0.0:
-        return choices[random.randint(0, len(choices)-1)]['city']
-    v = random.random()
-    for i in range(len(choices)):
-        v -= ((choices[i]['prob'])/total)
-        if v <= 0.0:
-            return choices[i]['city']
-    return choices[-1]['city']
-
-def greedy_select(choices):
-    return max(choices, key=lambda x:x['prob'])['city']
-	
-
-def stepwise_const(cities, phero, c_heur, c_greed):
-    perm = []
-    perm.append(random.randint(0, len(cities)-1))
-    while (len(perm) < len(cities)):
-        choices = calculate_choices(cities, perm[-1], perm, phero, c_heur, 1.0)
-        greedy = (random.random() <= c_greed)
-        next_city = greedy_select(choices) if (greedy) else prob_select(choices)
+    return np.full((num_cities, num_cities), init_pher)
+
+def calculate_choices(heuristic, last_city, visited, pheromone, c_hist):
+    weights = pheromone[last_city] ** c_hist if c_hist != 1.0 else pheromone[last_city].copy()
+    weights *= heuristic[last_city]
+    weights[visited] = 0.0
+    return weights
+
+def prob_select(weights, visited, rng=random):
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    if total <= 0.0:
+        return rng.choice(np.flatnonzero(~visited).tolist())
+    # the first city whose running total passes the draw, zero weights never pass it
+    i = int(np.searchsorted(cumulative, rng.random() * total, side='right'))
+    if i == len(weights):
+        # the draw rounded up to the total, take the last city that can be chosen
+        i = int(np.flatnonzero(weights)[-1])
+    return i
+
+def greedy_select(weights):
+    return int(np.argmax(weights))
+
+def stepwise_const(heuristic, phero, c_greed, rng=random):
+    n = len(heuristic)
+    perm = [rng.randint(0, n-1)]
+    visited = np.zeros(n, dtype=bool)
+    visited[perm[0]] = True
+    while (len(perm) < n):
+        weights = calculate_choices(heuristic, perm[-1], visited, phero, 1.0)
+        greedy = (rng.random() <= c_greed)
+        next_city = greedy_select(weights) if (greedy) else prob_select(weights, visited, rng)
         perm.append(next_city)
+        visited[next_city] = True
     return perm
 
+def tour_edges(vector):
+    a = np.asarray(vector)
+    return a, np.roll(a, -1)
+
 def global_update_pheromone(phero, cand, decay):
-    for i in range(len(cand['vector'])):
-        y = cand['vector'][0] if (i == (len(cand['vector'])-1)) else cand['vector'][i+1]
-        value = ((1.0-decay)*phero[cand['vector'][i]][y]) + (decay*(1.0/cand['cost']))
-        phero[cand['vector'][i]][y] = value
-        phero[y][cand['vector'][i]] = value
+    a, b = tour_edges(cand['vector'])
+    value = ((1.0-decay)*phero[a, b]) + (decay*(1.0/cand['cost']))
+    phero[a, b] = value
+    phero[b, a] = value
     return None
 
 def local_update_pheromone(pheromone, cand, c_local_phero, init_phero):
-    for i in range(len(cand['vector'])):
-        y = cand['vector'][0] if (i == (len(cand['vector'])-1)) else cand['vector'][i+1]
-        value = ((1.0-c_local_phero)*pheromone[cand['vector'][i]][y])+(c_local_phero*init_phero)
-        pheromone[cand['vector'][i]][y] = value
-        pheromone[y][cand['vector'][i]] = value
+    a, b = tour_edges(cand['vector'])
+    value = ((1.0-c_local_phero)*pheromone[a, b])+(c_local_phero*init_phero)
+    pheromone[a, b] = value
+    pheromone[b, a] = value
     return None
 
-def search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed):
-    best = {'vector':random_permutation(cities)}
-    best['cost'] = cost(best['vector'], cities)
+def colony_iteration(distances, heuristic, pheromone, best, num_ants, decay, c_local_phero, c_greed, init_pheromone,
+                     rng=random):
+    for i in range(num_ants):
+        cand = {}
+        cand['vector'] = stepwise_const(heuristic, pheromone, c_greed, rng)
+        cand['cost'] = cost(cand['vector'], distances)
+        if (cand['cost'] < best['cost']):
+            best = cand
+        local_update_pheromone(pheromone, cand, c_local_phero, init_pheromone)
+    global_update_pheromone(pheromone, best, decay)
+    return best
+
+def search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed, distances=None, seed=None, history=None):
+    # a seed gives the search a random stream of its own, otherwise it draws from the global one
+    rng = random if seed is None else random.Random(seed)
+    if distances is None:
+        distances = DistanceMatrix(cities)
+    best = {'vector':random_permutation(cities, rng)}
+    best['cost'] = cost(best['vector'], distances)
     init_pheromone = 1.0 / (float(len(cities)) * best['cost'])
     pheromone = initialise_pheromone_matrix(len(cities), init_pheromone)
+    heuristic = heuristic_matrix(distances, c_heur)
     for iter in range (max_it):
-        solutions = []
-        for i in range(num_ants):
-            cand = {}
-            cand['vector'] = stepwise_const(cities, pheromone, c_heur, c_greed)
-            cand['cost'] = cost(cand['vector'], cities)
-            if (cand['cost'] < best['cost']):
-                best = cand
-            local_update_pheromone(pheromone, cand, c_local_phero, init_pheromone)
-        global_update_pheromone(pheromone, best, decay)
-        # print(" > iteration #" + str(iter+1) + "; best=" + str(best['cost']))
+        best = colony_iteration(distances, heuristic, pheromone, best, num_ants, decay, c_local_phero, c_greed,
+                                init_pheromone, rng)
+        # history, if given, collects the best cost after every iteration
+        if history is not None:
+            history.append(best['cost'])
     return best
 
+# shared by every colony a worker process runs, set once when the worker starts
+_colony_data = {}
+
+def _init_colony_worker(distances, heuristic, params):
+    _colony_data['distances'] = distances
+    _colony_data['heuristic'] = heuristic
+    _colony_data['params'] = params
+
+def _run_colony(colony):
+    # runs one colony for an exchange period on its own random stream and hands its state back
+    distances = _colony_data['distances']
+    heuristic = _colony_data['heuristic']
+    num_ants, decay, c_local_phero, c_greed, init_pheromone = _colony_data['params']
+    started = time.perf_counter()
+    for iter in range(colony['iterations']):
+        colony['best'] = colony_iteration(distances, heuristic, colony['pheromone'], colony['best'], num_ants,
+                                          decay, c_local_phero, c_greed, init_pheromone, colony['rng'])
+        colony['history'].append(colony['best']['cost'])
+    colony['time'] += time.perf_counter() - started
+    return colony
 
+def multi_colony_search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed, num_colonies,
+                        exchange_every=10, blend=0.5, workers=None, seed=None, distances=None):
+    if distances is None:
+        distances = DistanceMatrix(cities)
+    heuristic = heuristic_matrix(distances, c_heur)
+    # every colony draws from its own independent stream
+    streams = np.random.SeedSequence(seed).spawn(num_colonies)
+    colonies = []
+    for stream in streams:
+        # the generator travels with the colony, so the caller's global random state is never touched
+        rng = random.Random(int(stream.generate_state(1, dtype=np.uint64)[0]))
+        best = {'vector':random_permutation(cities, rng)}
+        best['cost'] = cost(best['vector'], distances)
+        colonies.append({'best':best, 'rng':rng, 'history':[], 'time':0.0, 'exchanges':0})
+    # one initial pheromone level for every colony so their trails can be blended
+    init_pheromone = 1.0 / (float(len(cities)) * min(colony['best']['cost'] for colony in colonies))
+    for colony in colonies:
+        colony['pheromone'] = initialise_pheromone_matrix(len(cities), init_pheromone)
+    params = (num_ants, decay, c_local_phero, c_greed, init_pheromone)
+    executor = None
+    if workers is not None and workers > 1 and num_colonies > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_colony_worker,
+                                       initargs=(distances, heuristic, params))
+    else:
+        _init_colony_worker(distances, heuristic, params)
+    try:
+        done = 0
+        while done < max_it:
+            iterations = min(exchange_every, max_it - done)
+            for colony in colonies:
+                colony['iterations'] = iterations
+            if executor is None:
+                colonies = [_run_colony(colony) for colony in colonies]
+            else:
+                colonies = list(executor.map(_run_colony, colonies))
+            done += iterations
+            if done >= max_it:
+                break
+            # exchange: every colony pulls its trail towards the mean trail and reinforces the global best tour
+            best = min((colony['best'] for colony in colonies), key=lambda cand: cand['cost'])
+            mean = sum(colony['pheromone'] for colony in colonies) / num_colonies
+            for colony in colonies:
+                colony['pheromone'] = ((1.0-blend)*colony['pheromone']) + (blend*mean)
+                if best['cost'] < colony['best']['cost']:
+                    colony['best'] = best
+                global_update_pheromone(colony['pheromone'], best, decay)
+                colony['exchanges'] += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        else:
+            # do not keep the distances alive in this process after a serial run
+            _colony_data.clear()
+    best = min((colony['best'] for colony in colonies), key=lambda cand: cand['cost'])
+    stats = [{'cost':colony['best']['cost'], 'history':colony['history'], 'time':colony['time'],
+              'exchanges':colony['exchanges']} for colony in colonies]
+    return best, stats
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+class DistanceMatrix:
+    """
+    Pairwise euclidean distances between a set of cities, computed once and shared by the TSP solvers.
+
+    The square form stores every pair, the condensed form only stores the pairs i < j in a flat array
+    (n * (n - 1) / 2 entries), which halves the memory at the cost of a little index arithmetic per lookup.
+    The genetic solver indexes the condensed form directly, the ant colony solver keeps n x n pheromone and heuristic
+    matrices anyway and expands it with square().
+    """
+
+    def __init__(self, cities, dtype=np.float64, condensed=False, chunk=1024):
+        """
+        :param cities    : cities as a list of (x, y) points or an (n, 2) array
+        :param dtype     : storage type, np.float32 halves the memory
+        :param condensed : store only the upper triangle
+        :param chunk     : number of rows computed at a time, bounds the temporary memory used while building
+        """
+        self.coords = np.asarray(cities, dtype=float).reshape(-1, 2)
+        self.n = len(self.coords)
+        self.dtype = np.dtype(dtype)
+        self.condensed = condensed
+
+        if condensed:
+            self.data = np.empty(self.n * (self.n - 1) // 2, dtype=self.dtype)
+        else:
+            self.data = np.empty((self.n, self.n), dtype=self.dtype)
+
+        for start in range(0, self.n, chunk):
+            block = self.coords[start:start + chunk]
+            distances = np.sqrt(((block[:, None, :] - self.coords[None, :, :]) ** 2).sum(axis=2))
+
+            if condensed:
+                for row, i in enumerate(range(start, start + len(block))):
+                    first = self._condensed_index(i, i + 1)
+                    self.data[first:first + self.n - i - 1] = distances[row, i + 1:]
+            else:
+                self.data[start:start + len(block)] = distances
+
+    def __len__(self):
+        return self.n
+
+    def _condensed_index(self, i, j):
+        # position of the pair i < j in the flat upper triangle
+        return self.n * i - (i * (i + 1)) // 2 + (j - i - 1)
+
+    def __getitem__(self, key):
+        """
+        :param key : a pair of city indices, either may be an integer array for many lookups at once
+        :return    : the distance(s) between the cities
+        """
+        i, j = key
+
+        if not self.condensed:
+            return self.data[i, j]
+
+        i = np.asarray(i)
+        j = np.asarray(j)
+        lo = np.minimum(i, j)
+        hi = np.maximum(i, j)
+        same = lo == hi
+
+        # the diagonal is not stored, point it at any valid entry and zero it afterwards
+        index = np.where(same, 0, self.n * lo - (lo * (lo + 1)) // 2 + (hi - lo - 1))
+        values = np.where(same, 0, self.data[index] if len(self.data) else 0).astype(self.dtype)
+
+        return values[()] if values.ndim == 0 else values
+
+    def row(self, i):
+        """
+        :param i : index of a city
+        :return  : distances from city i to every city
+        """
+        if not self.condensed:
+            return self.data[i]
+
+        return self[np.full(self.n, i), np.arange(self.n)]
+
+    def square(self):
+        """
+        :return : the full (n, n) matrix
+        """
+        if not self.condensed:
+            return self.data
+
+        square = np.zeros((self.n, self.n), dtype=self.dtype)
+        upper = np.triu_indices(self.n, k=1)
+        square[upper] = self.data
+        square.T[upper] = self.data
+
+        return square
+
+    def path_length(self, order, closed=False):
+        """
+        :param order  : sequence of city indices
+        :param closed : add the edge from the last city back to the first
+        :return       : total length of the path
+        """
+        order = np.asarray(order, dtype=np.int64)
+
+        if len(order) < 2:
+            return 0.0
+
+        following = np.roll(order, -1) if closed else order[1:]
+        current = order if closed else order[:-1]
+
+        return float(np.sum(self[current, following], dtype=np.float64))
+
+    def tour_length(self, order):
+        """
+        :param order : sequence of city indices
+        :return      : length of the closed tour visiting the cities in that order
+        """
+        return self.path_length(order, closed=True)
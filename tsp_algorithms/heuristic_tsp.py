@@ -0,0 +1,260 @@
+"""
+author : Mohammed Guiga
+email  : guiga004@umn.edu
+
+Heuristic TSP for inputs too large for exact_tsp: a nearest neighbour tour improved by 2-opt and Or-opt moves over
+k nearest neighbour candidate lists, with don't-look bits so only the cities around a change are revisited.
+"""
+import math
+from collections import deque
+import numpy as np
+
+
+def to_array(cities):
+    """
+    :param cities   : cities as a list of (x, y) points or an (n, 2) array
+    :return         : an (n, 2) float array of the cities
+    """
+    return np.asarray(cities, dtype=float).reshape(-1, 2)
+
+
+def neighbour_lists(coords, k, chunk=1024, distances=None):
+    """
+    :param coords       : an (n, 2) array of the cities
+    :param k            : number of neighbours per city, capped at n - 1
+    :param chunk        : number of rows computed at a time, bounds the temporary memory
+    :param distances    : an optional DistanceMatrix of the cities, used instead of the coordinates
+    :return             : an (n, k) array with the k nearest neighbours of every city, closest first
+    """
+    n = len(coords)
+    k = min(k, n - 1)
+    neighbours = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, chunk):
+        block = coords[start:start + chunk]
+        if distances is None:
+            d2 = ((block[:, None, :] - coords[None, :, :]) ** 2).sum(axis=2)
+        else:
+            rows = np.arange(start, start + len(block))
+            d2 = distances[rows[:, None], np.arange(n)[None, :]].astype(float)
+        d2[np.arange(len(block)), np.arange(start, start + len(block))] = np.inf
+        nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(d2, nearest, axis=1), axis=1, kind='stable')
+        neighbours[start:start + chunk] = np.take_along_axis(nearest, order, axis=1)
+    return neighbours
+
+
+def nearest_neighbour_tour(coords, start=0, distances=None):
+    """
+    :param coords       : an (n, 2) array of the cities
+    :param start        : the city the tour starts at
+    :param distances    : an optional DistanceMatrix of the cities, used instead of the coordinates
+    :return             : a tour as a list of city indices, always moving on to the closest unvisited city
+    """
+    n = len(coords)
+    unvisited = np.ones(n, dtype=bool)
+    tour = [start]
+    unvisited[start] = False
+    current = start
+    for _ in range(n - 1):
+        if distances is None:
+            d2 = ((coords - coords[current]) ** 2).sum(axis=1)
+        else:
+            d2 = np.array(distances.row(current), dtype=float)
+        d2[~unvisited] = np.inf
+        current = int(np.argmin(d2))
+        tour.append(current)
+        unvisited[current] = False
+    return tour
+
+
+def tour_length(tour, coords):
+    """
+    :param tour     : a list of city indices
+    :param coords   : an (n, 2) array of the cities
+    :return         : length of the closed tour
+    """
+    ordered = coords[tour]
+    return float(np.hypot(*(np.roll(ordered, -1, axis=0) - ordered).T).sum())
+
+
+def _reverse(tour, pos, i, j):
+    """
+    :param tour : the tour, changed in place
+    :param pos  : position of every city in the tour, kept in step with it
+    :param i    : position the stretch starts at
+    :param j    : position the stretch ends at, the stretch runs forward from i and wraps around the end
+    :return     : reverses the stretch of the tour from position i to position j
+    """
+    n = len(tour)
+    length = (j - i) % n + 1
+    if 2 * length > n:
+        # reversing the complement gives the same cycle with less work
+        i, j = (j + 1) % n, (i - 1) % n
+        length = n - length
+    for step in range(length // 2):
+        a = (i + step) % n
+        b = (j - step) % n
+        tour[a], tour[b] = tour[b], tour[a]
+        pos[tour[a]] = a
+        pos[tour[b]] = b
+
+
+def _move_segment(tour, pos, first, size, after, reverse):
+    """
+    :param tour     : the tour, changed in place
+    :param pos      : position of every city in the tour, kept in step with it
+    :param first    : first city of the segment
+    :param size     : number of cities in the segment
+    :param after    : the city the segment is moved behind
+    :param reverse  : the segment is reversed as well
+    :return         : moves the segment of size cities starting at first so it follows after
+    """
+    n = len(tour)
+    start = pos[first]
+    rotated = tour[start:] + tour[:start]
+    segment = rotated[:size]
+    rest = rotated[size:]
+    if reverse:
+        segment.reverse()
+    insert = rest.index(after) + 1
+    tour[:] = rest[:insert] + segment + rest[insert:]
+    for index in range(n):
+        pos[tour[index]] = index
+
+
+def _two_opt_move(a, tour, pos, xs, ys, neighbours, eps):
+    """
+    :param a            : the city whose tour edges are tried
+    :param tour         : the tour, changed in place
+    :param pos          : position of every city in the tour, kept in step with it
+    :param xs           : x coordinates of the cities
+    :param ys           : y coordinates of the cities
+    :param neighbours   : candidate lists as returned by neighbour_lists
+    :param eps          : smallest gain that counts as an improvement
+    :return             : the four cities of the applied 2-opt move, None if no move improves the tour
+    """
+    n = len(tour)
+    for forward in (True, False):
+        b = tour[(pos[a] + 1) % n] if forward else tour[(pos[a] - 1) % n]
+        d_ab = math.hypot(xs[a] - xs[b], ys[a] - ys[b])
+        for c in neighbours[a]:
+            d_ac = math.hypot(xs[a] - xs[c], ys[a] - ys[c])
+            g1 = d_ab - d_ac
+            if g1 <= eps:
+                break
+            d = tour[(pos[c] + 1) % n] if forward else tour[(pos[c] - 1) % n]
+            if c == b or d == a:
+                continue
+            gain = g1 + math.hypot(xs[c] - xs[d], ys[c] - ys[d]) - math.hypot(xs[b] - xs[d], ys[b] - ys[d])
+            if gain > eps:
+                if forward:
+                    # a b ... c d  ->  a c ... b d
+                    _reverse(tour, pos, pos[b], pos[c])
+                else:
+                    # d c ... b a  ->  d b ... c a
+                    _reverse(tour, pos, pos[c], pos[b])
+                return (a, b, c, d)
+    return None
+
+
+def _or_opt_move(a, tour, pos, xs, ys, neighbours, eps, max_segment):
+    """
+    :param a            : the first city of the segments that are tried
+    :param tour         : the tour, changed in place
+    :param pos          : position of every city in the tour, kept in step with it
+    :param xs           : x coordinates of the cities
+    :param ys           : y coordinates of the cities
+    :param neighbours   : candidate lists as returned by neighbour_lists
+    :param eps          : smallest gain that counts as an improvement
+    :param max_segment  : longest segment that is moved
+    :return             : the cities around the applied move, None if no move improves the tour
+    """
+    n = len(tour)
+    if n < 5:
+        return None
+    for size in range(1, min(max_segment, n - 3) + 1):
+        first = a
+        last = tour[(pos[a] + size - 1) % n]
+        prev = tour[(pos[first] - 1) % n]
+        nxt = tour[(pos[last] + 1) % n]
+        segment = set(tour[(pos[a] + step) % n] for step in range(size))
+        removal = (math.hypot(xs[prev] - xs[first], ys[prev] - ys[first])
+                   + math.hypot(xs[last] - xs[nxt], ys[last] - ys[nxt])
+                   - math.hypot(xs[prev] - xs[nxt], ys[prev] - ys[nxt]))
+        if removal <= eps:
+            continue
+        for end in (first, last):
+            for c in neighbours[end]:
+                d_ec = math.hypot(xs[end] - xs[c], ys[end] - ys[c])
+                if d_ec >= removal:
+                    break
+                if c in segment:
+                    continue
+                for e in (tour[(pos[c] + 1) % n], tour[(pos[c] - 1) % n]):
+                    if e in segment:
+                        continue
+                    # the segment goes between c and e with `end` touching c
+                    other = last if end == first else first
+                    added = (d_ec + math.hypot(xs[other] - xs[e], ys[other] - ys[e])
+                             - math.hypot(xs[c] - xs[e], ys[c] - ys[e]))
+                    if removal - added > eps:
+                        if e == tour[(pos[c] + 1) % n]:
+                            # c end ... other e
+                            _move_segment(tour, pos, first, size, c, reverse=(end == last))
+                        else:
+                            # e other ... end c
+                            _move_segment(tour, pos, first, size, e, reverse=(end == first))
+                        return (prev, nxt, first, last, c, e)
+    return None
+
+
+def local_search(tour, coords, neighbours, max_segment=3, eps=1e-10):
+    """
+    :param tour         : a tour as a list of city indices, changed in place
+    :param coords       : an (n, 2) array of the cities
+    :param neighbours   : candidate lists as returned by neighbour_lists
+    :param max_segment  : longest segment Or-opt moves
+    :param eps          : smallest gain that counts as an improvement
+    :return             : the tour once neither move improves it
+    """
+    # 2-opt and Or-opt driven by a queue of cities whose don't-look bit is off
+    n = len(tour)
+    xs = coords[:, 0].tolist()
+    ys = coords[:, 1].tolist()
+    neighbours = neighbours.tolist()
+    pos = [0] * n
+    for index, city in enumerate(tour):
+        pos[city] = index
+    queue = deque(tour)
+    active = [True] * n
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        touched = _two_opt_move(a, tour, pos, xs, ys, neighbours, eps)
+        if touched is None:
+            touched = _or_opt_move(a, tour, pos, xs, ys, neighbours, eps, max_segment)
+        if touched is not None:
+            for city in touched + (a,):
+                if not active[city]:
+                    active[city] = True
+                    queue.append(city)
+    return tour
+
+
+def search(cities, num_neighbours=10, max_segment=3, distances=None):
+    """
+    :param cities           : cities as a list of (x, y) points or an (n, 2) array
+    :param num_neighbours   : length of the candidate list of every city
+    :param max_segment      : longest segment Or-opt moves
+    :param distances        : an optional DistanceMatrix of the cities
+    :return                 : the visiting order as indices into cities, starting at the first city
+    """
+    coords = to_array(cities)
+    n = len(coords)
+    if n <= 3:
+        return list(range(n))
+    neighbours = neighbour_lists(coords, num_neighbours, distances=distances)
+    tour = nearest_neighbour_tour(coords, start=0, distances=distances)
+    tour = local_search(tour, coords, neighbours, max_segment=max_segment)
+    start = tour.index(0)
+    return tour[start:] + tour[:start]
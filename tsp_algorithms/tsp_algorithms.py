@@ -1,11 +1,23 @@
-import tsp
+import time
 import tsp_algorithms.Ants_python as ant
 import tsp_algorithms.tsp_genetic as gene
+import tsp_algorithms.heuristic_tsp as heur
+from tsp_algorithms.distance_matrix import DistanceMatrix
+from tools import instrumentation
 
-def ant_tsp(cities):
+# above this many cities exact_tsp hands the problem to heuristic_tsp
+EXACT_TSP_MAX_CITIES = 40
+
+def ant_tsp(cities, distances=None, colonies=1, workers=None, exchange_every=10, seed=None, return_stats=False):
     """
-    :param cities : cities to run TSP on
-    :return       : path calculated by this algorithm
+    :param cities         : cities to run TSP on
+    :param distances      : an optional DistanceMatrix of the cities, built here if not given
+    :param colonies       : number of ant colonies, more than one runs ant.multi_colony_search
+    :param workers        : number of worker processes the colonies are spread over, None or 1 runs them in turn
+    :param exchange_every : iterations between the colonies exchanging their best tours and pheromone
+    :param seed           : seed of the random streams, None draws a single colony from the global random state
+    :param return_stats   : also return a list with the cost, history, time and exchanges of every colony
+    :return               : path calculated by this algorithm, and the colony stats if return_stats is set
     """
 
     # ant algorithm configuration
@@ -16,25 +28,66 @@ def ant_tsp(cities):
     c_local_phero = 0.1
     c_greed = 0.9
 
-    best = ant.search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed)
+    if distances is None:
+        distances = DistanceMatrix(cities)
+
+    instrumentation.count(f'tsp.ant.size.{len(cities)}')
+
+    with instrumentation.span('ant_tsp'):
+        if colonies > 1:
+            best, stats = ant.multi_colony_search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed,
+                                                  colonies, exchange_every=exchange_every, workers=workers, seed=seed,
+                                                  distances=distances)
+        else:
+            history = []
+            started = time.perf_counter()
+            best = ant.search(cities, max_it, num_ants, decay, c_heur, c_local_phero, c_greed, distances=distances,
+                              seed=seed, history=history)
+            stats = [{'cost': best['cost'], 'history': history, 'time': time.perf_counter() - started,
+                      'exchanges': 0}]
 
     ant_route = [cities[i] for i in best['vector']]
 
+    if return_stats:
+        return ant_route, stats
+
     return ant_route
 
-def genetic_tsp(cities):
+def genetic_tsp(cities, distances=None, islands=1, workers=None, migration_interval=10, topology='ring',
+                seed=None, return_stats=False):
     """
-    :param cities : cities to run TSP on
-    :return       : path calculated by this algorithm
+    :param cities             : cities to run TSP on
+    :param distances          : an optional DistanceMatrix of the cities, built here if not given
+    :param islands            : number of sub-populations, more than one runs gene.islandModel
+    :param workers            : number of worker processes the islands are spread over, None or 1 runs them in turn
+    :param migration_interval : generations between elites migrating from island to island
+    :param topology           : 'ring' sends migrants to the next island, 'random' to any other island
+    :param seed               : seed of the random streams
+    :param return_stats       : also return the convergence curve (best distance per generation) of every island
+    :return                   : path calculated by this algorithm, and the curves if return_stats is set,
+                                gene.plotProgress draws them
     """
     citylist = []
 
-    for city in cities:
-        citylist.append(gene.City(x=city[0], y=city[1]))
+    if distances is None:
+        distances = DistanceMatrix(cities)
+
+    for i, city in enumerate(cities):
+        citylist.append(gene.City(x=city[0], y=city[1], index=i))
 
-    # geneticAlgorithmPlot(population=cityList, popSize=100, eliteSize=20, mutationRate=0.01, generations=500)
-    node_path = gene.geneticAlgorithm(population=citylist, popSize=100, eliteSize=20, mutationRate=0.01,
-                                      generations=500)
+    instrumentation.count(f'tsp.genetic.size.{len(cities)}')
+
+    with instrumentation.span('genetic_tsp'):
+        if islands > 1:
+            node_path, progress = gene.islandModel(population=citylist, popSize=100, eliteSize=20, mutationRate=0.01,
+                                                   generations=500, numIslands=islands,
+                                                   migrationInterval=migration_interval, topology=topology,
+                                                   workers=workers, distances=distances, seed=seed)
+        else:
+            curve = []
+            node_path = gene.geneticAlgorithm(population=citylist, popSize=100, eliteSize=20, mutationRate=0.01,
+                                              generations=500, distances=distances, seed=seed, progress=curve)
+            progress = [curve]
 
     path = []
     # the path is actually made up of "Node" objects
@@ -42,16 +95,47 @@ def genetic_tsp(cities):
     for node in node_path:
         path.append((node.x, node.y))
 
+    if return_stats:
+        return path, progress
+
     return path
 
-def exact_tsp(cities):
+def heuristic_tsp(cities, distances=None):
     """
-    :param cities : cities to run TSP on
-    :return       : path calculated by this algorithm
+    :param cities    : cities to run TSP on
+    :param distances : an optional DistanceMatrix of the cities, used for the neighbour lists and construction
+    :return          : path calculated by this algorithm, starting at the first city
 
-    * this uses the python tsp package - exact algorithm
+    * nearest neighbour construction improved with 2-opt and Or-opt moves
     """
-    path = tsp.tsp(cities)[1]
+    instrumentation.count(f'tsp.heuristic.size.{len(cities)}')
+
+    with instrumentation.span('heuristic_tsp'):
+        path = heur.search(cities, num_neighbours=10, max_segment=3, distances=distances)
+
+    heuristic_route = [cities[i] for i in path]
+
+    return heuristic_route
+
+def exact_tsp(cities, max_cities=EXACT_TSP_MAX_CITIES, distances=None):
+    """
+    :param cities     : cities to run TSP on
+    :param max_cities : above this many cities heuristic_tsp is used instead, None always solves exactly
+    :param distances  : an optional DistanceMatrix of the cities, handed to heuristic_tsp
+    :return           : path calculated by this algorithm
+
+    * this uses the python tsp package - exact algorithm, which computes its own distances
+    """
+    if max_cities is not None and len(cities) > max_cities:
+        return heuristic_tsp(cities, distances=distances)
+
+    instrumentation.count(f'tsp.exact.size.{len(cities)}')
+
+    # the tsp package is only needed here, importing it lazily keeps the other solvers usable without it
+    import tsp
+
+    with instrumentation.span('exact_tsp'):
+        path = tsp.tsp(cities)[1]
 
     exact_route = [cities[i] for i in path]
 
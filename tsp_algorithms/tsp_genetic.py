@@ -1,170 +1,133 @@
-import numpy as np, random, operator, pandas as pd, matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tsp_algorithms.distance_matrix import DistanceMatrix
 
 class City:
-    def __init__(self, x, y):
+    def __init__(self, x, y, index=None):
         self.x = x
         self.y = y
-
-    def distance(self, city):
-        xDis = abs(self.x - city.x)
-        yDis = abs(self.y - city.y)
-        distance = np.sqrt((xDis ** 2) + (yDis ** 2))
-        return distance
+        # position of the city in a DistanceMatrix, if one is used
+        self.index = index
 
     def __repr__(self):
         return "(" + str(self.x) + "," + str(self.y) + ")"
 
 
-class Fitness:
-    def __init__(self, route):
-        self.route = route
-        self.distance = 0
-        self.fitness = 0.0
-
-    def routeDistance(self):
-        if self.distance == 0:
-            pathDistance = 0
-            for i in range(0, len(self.route)):
-                fromCity = self.route[i]
-                toCity = None
-                if i + 1 < len(self.route):
-                    toCity = self.route[i + 1]
-                else:
-                    toCity = self.route[0]
-                pathDistance += fromCity.distance(toCity)
-            self.distance = pathDistance
-        return self.distance
-
-    def routeFitness(self):
-        if self.fitness == 0:
-            self.fitness = 1 / float(self.routeDistance())
-        return self.fitness
-
-
-
-def createRoute(cityList):
-    route = random.sample(cityList, len(cityList))
-    return route
-
-
-def initialPopulation(popSize, cityList):
-    population = []
-
-    for i in range(0, popSize):
-        population.append(createRoute(cityList))
-    return population
-
+def initialPopulation(popSize, numCities, rng):
+    # every row is a route, a permutation of the city indices
+    return np.argsort(rng.random((popSize, numCities)), axis=1)
 
 
-def rankRoutes(population):
-    fitnessResults = {}
-    for i in range(0,len(population)):
-        fitnessResults[i] = Fitness(population[i]).routeFitness()
+def routeDistances(population, distances):
+    # distances is the square matrix or a DistanceMatrix, each row sums its edges including the one back to the start
+    return distances[population, np.roll(population, -1, axis=1)].sum(axis=1)
 
-    return sorted(fitnessResults.items(), key = operator.itemgetter(1), reverse = True)
 
+def rankRoutes(population, distances):
+    fitness = 1 / routeDistances(population, distances)
+    order = np.argsort(-fitness, kind='stable')
+    return order, fitness[order]
 
-def selection(popRanked, eliteSize):
-    selectionResults = []
-    df = pd.DataFrame(np.array(popRanked), columns=["Index", "Fitness"])
-    df['cum_sum'] = df.Fitness.cumsum()
-    df['cum_perc'] = 100 * df.cum_sum / df.Fitness.sum()
 
-    for i in range(0, eliteSize):
-        selectionResults.append(popRanked[i][0])
-    for i in range(0, len(popRanked) - eliteSize):
-        pick = 100 * random.random()
-        for i in range(0, len(popRanked)):
-            if pick <= df.iat[i, 3]:
-                selectionResults.append(popRanked[i][0])
-                break
-    return selectionResults
+def selection(popRanked, eliteSize, rng):
+    order, fitness = popRanked
+    cumulative = np.cumsum(fitness)
+    # roulette over the ranked routes, the first route whose running total reaches the pick
+    picks = np.searchsorted(cumulative, rng.random(len(order) - eliteSize) * cumulative[-1])
+    picks = np.minimum(picks, len(order) - 1)
+    return np.concatenate((order[:eliteSize], order[picks]))
 
 
 def matingPool(population, selectionResults):
-    matingpool = []
-    for i in range(0, len(selectionResults)):
-        index = selectionResults[i]
-        matingpool.append(population[index])
-    return matingpool
+    return population[selectionResults]
 
 
-def breed(parent1, parent2):
-    child = []
-    childP1 = []
-    childP2 = []
+def breed(parent1, parent2, rng):
+    # ordered crossover of every pair of rows at once, a slice of parent1 followed by the rest of parent2
+    numChildren, numCities = parent1.shape
+    rows = np.arange(numChildren)[:, None]
+    positions = np.arange(numCities)[None, :]
 
-    geneA = int(random.random() * len(parent1))
-    geneB = int(random.random() * len(parent1))
+    genes = (rng.random((numChildren, 2)) * numCities).astype(np.int64)
+    startGene = genes.min(axis=1)[:, None]
+    endGene = genes.max(axis=1)[:, None]
 
-    startGene = min(geneA, geneB)
-    endGene = max(geneA, geneB)
+    inSlice = (positions >= startGene) & (positions < endGene)
+    taken = np.zeros((numChildren, numCities), dtype=bool)
+    taken[np.nonzero(inSlice)[0], parent1[inSlice]] = True
+    keep = ~taken[rows, parent2]
 
-    for i in range(startGene, endGene):
-        childP1.append(parent1[i])
+    child = np.empty_like(parent1)
+    sliceRows, slicePositions = np.nonzero(inSlice)
+    child[sliceRows, slicePositions - startGene[sliceRows, 0]] = parent1[inSlice]
 
-    childP2 = [item for item in parent2 if item not in childP1]
-
-    child = childP1 + childP2
+    rank = np.cumsum(keep, axis=1) - 1 + (endGene - startGene)
+    child[np.nonzero(keep)[0], rank[keep]] = parent2[keep]
     return child
 
 
-def breedPopulation(matingpool, eliteSize):
-    children = []
+def breedPopulation(matingpool, eliteSize, rng):
     length = len(matingpool) - eliteSize
-    pool = random.sample(matingpool, len(matingpool))
+    pool = matingpool[rng.permutation(len(matingpool))]
 
-    for i in range(0, eliteSize):
-        children.append(matingpool[i])
+    children = breed(pool[:length], pool[::-1][:length], rng)
+    return np.concatenate((matingpool[:eliteSize], children))
 
-    for i in range(0, length):
-        child = breed(pool[i], pool[len(matingpool) - i - 1])
-        children.append(child)
-    return children
 
+def mutatePopulation(population, mutationRate, rng):
+    # swap mutation, each position swaps with a random position with probability mutationRate
+    rows, swapped = np.nonzero(rng.random(population.shape) < mutationRate)
+    swapWith = rng.integers(population.shape[1], size=len(rows))
 
-def mutate(individual, mutationRate):
-    for swapped in range(len(individual)):
-        if (random.random() < mutationRate):
-            swapWith = int(random.random() * len(individual))
+    for row, i, j in zip(rows.tolist(), swapped.tolist(), swapWith.tolist()):
+        population[row, i], population[row, j] = population[row, j], population[row, i]
+    return population
 
-            city1 = individual[swapped]
-            city2 = individual[swapWith]
 
-            individual[swapped] = city2
-            individual[swapWith] = city1
-    return individual
+def nextGeneration(currentGen, eliteSize, mutationRate, distances, rng):
+    popRanked = rankRoutes(currentGen, distances)
+    selectionResults = selection(popRanked, eliteSize, rng)
+    matingpool = matingPool(currentGen, selectionResults)
+    children = breedPopulation(matingpool, eliteSize, rng)
+    nextGeneration = mutatePopulation(children, mutationRate, rng)
+    return nextGeneration
 
 
-def mutatePopulation(population, mutationRate):
-    mutatedPop = []
+def distanceArray(population, distances=None):
+    # the distances between the cities, in the order they are listed, a condensed DistanceMatrix is indexed as it is
+    # so its memory saving carries over, otherwise the square matrix is used
+    if distances is None:
+        distances = DistanceMatrix([(city.x, city.y) for city in population])
+        return distances.square()
 
-    for ind in range(0, len(population)):
-        mutatedInd = mutate(population[ind], mutationRate)
-        mutatedPop.append(mutatedInd)
-    return mutatedPop
+    indices = [city.index for city in population]
+    if distances.condensed:
+        if indices == list(range(len(distances))):
+            return distances
+        return DistanceMatrix(distances.coords[indices], dtype=distances.dtype, condensed=True)
 
+    if indices == list(range(len(distances))):
+        return distances.square()
+    return distances.square()[np.ix_(indices, indices)]
 
 
-def nextGeneration(currentGen, eliteSize, mutationRate):
-    popRanked = rankRoutes(currentGen)
-    selectionResults = selection(popRanked, eliteSize)
-    matingpool = matingPool(currentGen, selectionResults)
-    children = breedPopulation(matingpool, eliteSize)
-    nextGeneration = mutatePopulation(children, mutationRate)
-    return nextGeneration
-
-
-def geneticAlgorithm(population, popSize, eliteSize, mutationRate, generations):
-    pop = initialPopulation(popSize, population)
-    # print("Initial distance: " + str(1 / rankRoutes(pop)[0][1]))
+def geneticAlgorithm(population, popSize, eliteSize, mutationRate, generations, distances=None, seed=None,
+                     progress=None):
+    rng = np.random.default_rng(seed)
+    matrix = distanceArray(population, distances)
+    pop = initialPopulation(popSize, len(population), rng)
+    # progress, if given, collects the best distance of the initial population and after every generation
+    if progress is not None:
+        progress.append(float(1 / rankRoutes(pop, matrix)[1][0]))
 
     for i in range(0, generations):
-        pop = nextGeneration(pop, eliteSize, mutationRate)
+        pop = nextGeneration(pop, eliteSize, mutationRate, matrix, rng)
+        if progress is not None:
+            progress.append(float(1 / rankRoutes(pop, matrix)[1][0]))
 
-    # print("Final distance: " + str(1 / rankRoutes(pop)[0][1]))
-    bestRouteIndex = rankRoutes(pop)[0][0]
-    bestRoute = pop[bestRouteIndex]
+    # print("Final distance: " + str(1 / rankRoutes(pop, matrix)[1][0]))
+    bestRouteIndex = rankRoutes(pop, matrix)[0][0]
+    bestRoute = [population[i] for i in pop[bestRouteIndex].tolist()]
 
     return bestRoute
 
@@ -176,19 +139,107 @@ def geneticAlgorithm(population, popSize, eliteSize, mutationRate, generations):
 # geneticAlgorithm(population=cityList, popSize=100, eliteSize=20, mutationRate=0.01, generations=500)
 
 
-def geneticAlgorithmPlot(population, popSize, eliteSize, mutationRate, generations):
-    pop = initialPopulation(popSize, population)
-    progress = []
-    progress.append(1 / rankRoutes(pop)[0][1])
-
-    for i in range(0, generations):
-        pop = nextGeneration(pop, eliteSize, mutationRate)
-        progress.append(1 / rankRoutes(pop)[0][1])
-
-    plt.plot(progress)
+# the distance matrix shared by every island a worker process evolves, set once when the worker starts
+_islandData = {}
+
+
+def _initIslandWorker(matrix, eliteSize, mutationRate):
+    _islandData['matrix'] = matrix
+    _islandData['eliteSize'] = eliteSize
+    _islandData['mutationRate'] = mutationRate
+
+
+def _evolveIsland(island):
+    # evolves one island for a migration period on its own random stream and hands it back
+    matrix = _islandData['matrix']
+    for i in range(0, island['generations']):
+        island['pop'] = nextGeneration(island['pop'], _islandData['eliteSize'], _islandData['mutationRate'], matrix,
+                                       island['rng'])
+        island['progress'].append(float(1 / rankRoutes(island['pop'], matrix)[1][0]))
+    return island
+
+
+def migrate(islands, migrationSize, topology, matrix, rng, eliteSize=0):
+    # the best routes of every island replace the worst routes of the island they migrate to, an island's eliteSize
+    # best routes are never replaced, so with several sources sending to one island the later migrants are capped
+    ranked = [rankRoutes(island['pop'], matrix)[0] for island in islands]
+    migrants = [island['pop'][order[:migrationSize]].copy() for island, order in zip(islands, ranked)]
+
+    if topology == 'ring':
+        destinations = [(i + 1) % len(islands) for i in range(len(islands))]
+    elif topology == 'random':
+        destinations = [int(rng.choice([j for j in range(len(islands)) if j != i])) for i in range(len(islands))]
+    else:
+        raise ValueError(f'unknown migration topology {topology}')
+
+    for source, destination in enumerate(destinations):
+        remaining = len(ranked[destination])
+        count = min(migrationSize, remaining - eliteSize)
+        if count <= 0:
+            continue
+        worst = ranked[destination][remaining - count:]
+        islands[destination]['pop'][worst] = migrants[source][:count]
+        # later migrants must not overwrite these, so the ranking is only used once per destination
+        ranked[destination] = ranked[destination][:remaining - count]
+
+
+def islandModel(population, popSize, eliteSize, mutationRate, generations, numIslands=4, migrationInterval=10,
+                migrationSize=2, topology='ring', workers=None, distances=None, seed=None):
+    if migrationSize > popSize - eliteSize:
+        raise ValueError(f'migrationSize {migrationSize} leaves no room beside the {eliteSize} elites of an island '
+                         f'of {popSize}')
+    matrix = distanceArray(population, distances)
+    # every island evolves on its own independent stream
+    streams = np.random.SeedSequence(seed).spawn(numIslands + 1)
+    rng = np.random.default_rng(streams[0])
+    islands = []
+    for stream in streams[1:]:
+        islandRng = np.random.default_rng(stream)
+        pop = initialPopulation(popSize, len(population), islandRng)
+        islands.append({'pop':pop, 'rng':islandRng, 'progress':[float(1 / rankRoutes(pop, matrix)[1][0])]})
+
+    executor = None
+    if workers is not None and workers > 1 and numIslands > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_initIslandWorker,
+                                       initargs=(matrix, eliteSize, mutationRate))
+    else:
+        _initIslandWorker(matrix, eliteSize, mutationRate)
+
+    try:
+        done = 0
+        while done < generations:
+            for island in islands:
+                island['generations'] = min(migrationInterval, generations - done)
+            if executor is None:
+                islands = [_evolveIsland(island) for island in islands]
+            else:
+                islands = list(executor.map(_evolveIsland, islands))
+            done += islands[0]['generations']
+            if done < generations and numIslands > 1 and migrationSize > 0:
+                migrate(islands, migrationSize, topology, matrix, rng, eliteSize)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    bests = [rankRoutes(island['pop'], matrix) for island in islands]
+    bestIsland = int(np.argmax([fitness[0] for order, fitness in bests]))
+    bestRoute = [population[i] for i in islands[bestIsland]['pop'][bests[bestIsland][0][0]].tolist()]
+    progress = [island['progress'] for island in islands]
+
+    return bestRoute, progress
+
+
+def plotProgress(progress):
+    import matplotlib.pyplot as plt
+
+    for i, curve in enumerate(progress):
+        plt.plot(curve, label=f'island {i}')
     plt.ylabel('Distance')
     plt.xlabel('Generation')
+    plt.legend()
     plt.show()
 
 
-# geneticAlgorithmPlot(population=cityList, popSize=100, eliteSize=20, mutationRate=0.01, generations=500)
+# bestRoute, progress = islandModel(population=cityList, popSize=100, eliteSize=20, mutationRate=0.01,
+#                                   generations=500, numIslands=4, workers=4)
+# plotProgress(progress)